@@ -0,0 +1,84 @@
+"""
+Measurements shared by the benchmarks of programming assignments 2 and 3
+
+benchmarking.py holds the helpers that pa2/benchmark.py and pa3/benchmark.py have in common: timing a function over
+repeated runs, measuring the peak memory of a phase of a benchmark, and recording the commit the results were measured
+at. The benchmarks import it from the directory above their own.
+"""
+
+from time import perf_counter
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Returns an argparse type that accepts only positive integers
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be a positive integer")
+    return value
+
+
+# Returns an argparse type that accepts only integers of 0 or more
+def non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("must be an integer of 0 or more")
+    return value
+
+
+# Returns the fastest of repeat runs of function, in seconds, along with the result of the last run
+def best_time(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        result = function()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+# Clears the peak resident set size of this process, where the system allows it (Linux 4.0 and later), so that the
+# peak of each phase can be measured on its own. Elsewhere, peak_rss() returns the peak of the whole process so far.
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", 'w') as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+# Returns the peak resident set size of this process in megabytes
+def peak_rss():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+# Runs function, timing it and measuring the peak memory of the process while it runs, and returns its result, its
+# time in seconds and the peak in megabytes
+def measure(function):
+    reset_peak_rss()
+    start = perf_counter()
+    result = function()
+    seconds = perf_counter() - start
+    return result, seconds, peak_rss()
+
+
+# Returns the commit the benchmark is run at, or None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,312 @@
+"""
+Programming Assignment 2 - N-Gram Language Model: benchmarks
+
+benchmark.py measures the speed of ngram.py. To run it, type the following into the command line:
+
+benchmark.py tokenizer [--order n] [--repeat r] [filename1.txt filename2.txt [...]]
+benchmark.py scaling [--sizes words ...] [--orders n ...] [--sentences m] [--output results.json]
+benchmark.py compare old.json new.json [--tolerance percent] [--min-seconds s]
+
+The tokenizer benchmark compares the sentence splitter and tokenizer ngram.py was first written with, which splits the
+text of a file into sentences, searches each sentence for words and pads it one <start> token at a time, with the bulk
+tokenizer that training uses, which searches a whole chunk of text at once and finds the ends of its sentences
+afterwards. The last row adds what training does next: encoding the words as integer IDs, leaving out sentences too
+short to learn from and padding the rest. Every tokenizer is run on the given files (the Project Gutenberg texts next
+to ngram.py by default), each measurement is repeated r times and the fastest run is reported, in tokens per second.
+The two tokenizers are checked to produce the same sentences.
+
+Sample run:
+
+%python benchmark.py tokenizer --order 3
+
+tokenizer                        seconds     tokens/s
+sentences then words               1.013      1377853
+bulk                               0.536      2606993
+bulk, encoded and padded           1.088      1283192
+
+The scaling benchmark measures how training and generation scale with the size of the corpus and with n. It writes
+synthetic corpora of the given numbers of words (100000, 300000 and 1000000 by default), whose words follow Zipf's law
+over a vocabulary of 50000 words, and also uses the three Project Gutenberg texts. For every corpus and every n (1 to 6
+by default), a fresh process goes through the phases of the program and reports for each of them its wall time, the
+peak resident memory of the process during the phase, and its throughput:
+
+count        reading and tokenizing the corpus and counting its ngrams (corpus tokens per second)
+build        compiling the counts into the model's trie (ngrams per second)
+save, load   writing the model file and memory-mapping it again (megabytes per second)
+generate     generating m sentences, 1000 by default, one at a time (sentences per second)
+vectorized   generating m sentences with NumPy (sentences per second)
+score        computing the perplexity of held-out text (tokens per second). Synthetic corpora are scored on another
+             synthetic corpus a tenth of their size, and the Project Gutenberg texts on pg2600.txt, which the model was
+             trained on, so only the speed of this phase is meaningful.
+
+The results are saved as JSON, together with the commit they were measured at, so that runs at different commits can
+be compared with the compare benchmark. It lists the change in time of every phase measured in both runs and exits
+with status 1 if any phase became slower by more than the tolerance (10% by default). Phases that took less than
+0.05 seconds (or --min-seconds) in both runs are too short to time reliably and are never reported as slower.
+"""
+
+from multiprocessing import get_context
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+
+import numpy as np
+
+from ngram import (START, END, NgramModel, SentenceGenerator, Vocabulary, iter_sentence_ids, read_tokens, score,
+                   train)
+
+# Timing and memory measurements are shared with the other benchmarks, in benchmarking.py one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from benchmarking import best_time, git_commit, measure, positive_int  # noqa: E402
+
+# Texts used when no files are given
+DEFAULT_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                 for name in ("pg2554.txt", "pg2600.txt", "pg1399.txt")]
+
+# Sizes of the synthetic corpora of the scaling benchmark, in words
+DEFAULT_SIZES = [100000, 300000, 1000000]
+
+# Number of distinct words in a synthetic corpus, the exponent of its Zipf distribution, and the average number of
+# words in its sentences
+SYNTHETIC_VOCABULARY = 50000
+ZIPF_EXPONENT = 1.1
+SENTENCE_LENGTH = 20
+
+# Number of words of a synthetic corpus written at a time
+SYNTHETIC_BLOCK = 1 << 16
+
+
+# get_sentence_tokens() and get_word_tokens() as ngram.py was first written, for comparison
+def original_get_sentence_tokens(text):
+    text = text.lower()
+    text = text.replace("\n", " ")
+    tokens = re.split(r"(?<=[\.\!\?])\s*", text)
+    return [i for i in tokens if i]
+
+
+def original_get_word_tokens(sentence, n):
+    tokens = re.findall(r"[\w]+|[^\s\w]", sentence)
+    for i in range(n-1):
+        tokens.insert(0, START)
+    tokens.append(END)
+    return tokens
+
+
+# Returns the tokens of every sentence in the files, padded for ngrams of order n, using the original functions
+def sentence_tokens(filenames, n):
+    sentences = []
+    for filename in filenames:
+        with open(filename, errors='ignore', encoding='utf-8-sig') as file:
+            for sentence in original_get_sentence_tokens(file.read()):
+                sentences.append(original_get_word_tokens(sentence, n))
+    return sentences
+
+
+# Returns the flat token lists and sentence ends the bulk tokenizer finds in the files
+def bulk_tokens(filenames):
+    return [chunk for filename in filenames for chunk in read_tokens(filename)]
+
+
+# Cuts the output of bulk_tokens() into a list of sentences
+def split_chunks(chunks):
+    sentences = []
+    for tokens, ends in chunks:
+        start = 0
+        for end in ends:
+            sentences.append(tokens[start:end])
+            start = end
+    return sentences
+
+
+# Returns the padded, integer-encoded sentences that training counts ngrams in
+def encoded_tokens(filenames, n):
+    return [token_ids for token_ids, sentence_order in iter_sentence_ids(filenames, n, Vocabulary())]
+
+
+# Prints a row of a results table
+def print_row(name, seconds, tokens):
+    print(name.ljust(28) + ("%.3f" % seconds).rjust(12) + str(round(tokens / seconds)).rjust(13))
+
+
+def benchmark_tokenizer(filenames, n, repeat):
+    seconds, legacy = best_time(lambda: sentence_tokens(filenames, n), repeat)
+    # Count the words of every sentence, leaving out the padding and empty sentences
+    legacy = [sentence[n - 1:-1] for sentence in legacy if len(sentence) > n]
+    tokens = sum(len(sentence) for sentence in legacy)
+
+    print("tokenizer".ljust(28) + "seconds".rjust(12) + "tokens/s".rjust(13))
+    print_row("sentences then words", seconds, tokens)
+
+    seconds, bulk = best_time(lambda: bulk_tokens(filenames), repeat)
+    if split_chunks(bulk) != legacy:
+        raise SystemExit("The bulk tokenizer found different sentences.")
+    print_row("bulk", seconds, tokens)
+
+    seconds, encoded = best_time(lambda: encoded_tokens(filenames, n), repeat)
+    print_row("bulk, encoded and padded", seconds, tokens)
+
+
+# Writes a synthetic corpus of the given number of words to filename. Words are drawn independently from a Zipf
+# distribution over SYNTHETIC_VOCABULARY words, and every word ends a sentence with probability 1/SENTENCE_LENGTH.
+def write_synthetic_corpus(filename, words, seed):
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, SYNTHETIC_VOCABULARY + 1) ** ZIPF_EXPONENT
+    weights /= weights.sum()
+    names = np.array(["w" + str(i) for i in range(SYNTHETIC_VOCABULARY)])
+    with open(filename, 'w') as file:
+        for start in range(0, words, SYNTHETIC_BLOCK):
+            size = min(SYNTHETIC_BLOCK, words - start)
+            block = names[rng.choice(SYNTHETIC_VOCABULARY, size, p=weights)].astype(object)
+            ends = rng.random(size) < 1 / SENTENCE_LENGTH
+            block[ends] += " .\n"
+            file.write(" ".join(block) + " .\n")
+
+
+# Returns the number of tokens training reads from the files
+def count_tokens(filenames):
+    return sum(len(tokens) for filename in filenames for tokens, ends in read_tokens(filename))
+
+
+# Runs the phases of the program for one corpus and n in a process of its own, and returns a result for each phase
+def run_case(corpus, filenames, heldout, tokens, n, m):
+    results = []
+
+    # Runs function as the named phase and records it, with items processed in units, and returns its result
+    def phase(name, function, items=None, unit=None):
+        result, seconds, peak = measure(function)
+        if callable(items):
+            items = items(result)
+        results.append({"corpus": corpus, "tokens": tokens, "n": n, "phase": name, "seconds": round(seconds, 4),
+                        "peak_rss_mb": round(peak, 1), "items": items, "unit": unit,
+                        "per_second": round(items / seconds, 1) if seconds > 0 else None})
+        return result
+
+    vocab, counts = phase("count", lambda: train(filenames, n), tokens, "tokens")
+    model = phase("build", lambda: NgramModel.from_counts(n, vocab, counts), lambda model: model.num_nodes(), "ngrams")
+    del counts
+    with tempfile.TemporaryDirectory(prefix="ngram-benchmark-") as temp_dir:
+        filename = os.path.join(temp_dir, "model.bin")
+        size = model.num_bytes() / 2 ** 20
+        phase("save", lambda: model.save(filename), size, "MB")
+        del model
+        model = phase("load", lambda: NgramModel.load(filename), size, "MB")
+        phase("generate", lambda: SentenceGenerator(model, n, seed=0).generate(m), m, "sentences")
+        phase("vectorized", lambda: SentenceGenerator(model, n, seed=0).generate_vectorized(m), m, "sentences")
+        phase("score", lambda: score(model, heldout, n), lambda result: result.tokens, "tokens")
+        model.close()
+    return results
+
+
+# Prints a row of the scaling results table
+def print_result(result):
+    print(result["corpus"].ljust(18) + str(result["n"]).rjust(3) + "  " + result["phase"].ljust(12) +
+          ("%.3f" % result["seconds"]).rjust(10) + ("%.1f" % result["peak_rss_mb"]).rjust(10) +
+          ("%.0f" % (result["per_second"] or 0)).rjust(14) + " " + result["unit"] + "/s")
+
+
+def benchmark_scaling(sizes, orders, m, output):
+    report = {"commit": git_commit(), "date": datetime.datetime.now().isoformat(timespec='seconds'),
+              "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+              "results": []}
+
+    print("corpus".ljust(18) + "n".rjust(3) + "  " + "phase".ljust(12) + "seconds".rjust(10) + "peak MB".rjust(10) +
+          "throughput".rjust(14))
+    with tempfile.TemporaryDirectory(prefix="ngram-corpora-") as corpus_dir:
+        corpora = []
+        for words in sizes:
+            filename = os.path.join(corpus_dir, "synthetic-" + str(words) + ".txt")
+            heldout = os.path.join(corpus_dir, "heldout-" + str(words) + ".txt")
+            write_synthetic_corpus(filename, words, seed=words)
+            write_synthetic_corpus(heldout, max(1, words // 10), seed=words + 1)
+            corpora.append(("synthetic-" + str(words), [filename], [heldout]))
+        corpora.append(("gutenberg", DEFAULT_FILES, [DEFAULT_FILES[1]]))
+
+        # Every case runs in a new process, so that the memory of one case does not count towards the next
+        context = get_context("spawn")
+        for corpus, filenames, heldout in corpora:
+            tokens = count_tokens(filenames)
+            for n in orders:
+                with context.Pool(1) as pool:
+                    results = pool.apply(run_case, (corpus, filenames, heldout, tokens, n, m))
+                for result in results:
+                    print_result(result)
+                report["results"].extend(results)
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=1)
+    print("Saved results to " + output)
+
+
+def benchmark_compare(old_filename, new_filename, tolerance, min_seconds):
+    with open(old_filename) as file:
+        old = json.load(file)
+    with open(new_filename) as file:
+        new = json.load(file)
+    old_seconds = {(result["corpus"], result["n"], result["phase"]): result["seconds"] for result in old["results"]}
+
+    print("comparing " + str(old.get("commit")) + " to " + str(new.get("commit")))
+    print("corpus".ljust(18) + "n".rjust(3) + "  " + "phase".ljust(12) + "old".rjust(10) + "new".rjust(10) +
+          "change".rjust(10))
+    slower = 0
+    for result in new["results"]:
+        key = (result["corpus"], result["n"], result["phase"])
+        if key not in old_seconds:
+            continue
+        change = 100 * (result["seconds"] / old_seconds[key] - 1) if old_seconds[key] else 0
+        flag = ""
+        if change > tolerance and max(result["seconds"], old_seconds[key]) >= min_seconds:
+            flag = "  slower"
+            slower += 1
+        print(key[0].ljust(18) + str(key[1]).rjust(3) + "  " + key[2].ljust(12) + ("%.3f" % old_seconds[key]).rjust(10) +
+              ("%.3f" % result["seconds"]).rjust(10) + ("%+.1f%%" % change).rjust(10) + flag)
+    if slower:
+        raise SystemExit(str(slower) + " phases became slower by more than " + str(tolerance) + "%.")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    tokenizer_parser = benchmarks.add_parser("tokenizer", help="compare the sentence splitters and tokenizers")
+    tokenizer_parser.add_argument("--order", type=positive_int, default=3,
+                                  help="order of the ngrams sentences are padded for (default: 3)")
+    tokenizer_parser.add_argument("--repeat", type=positive_int, default=3,
+                                  help="number of times each measurement is repeated (default: 3)")
+    tokenizer_parser.add_argument("files", nargs="*", default=DEFAULT_FILES,
+                                  help="plain text files to tokenize (default: the texts next to ngram.py)")
+
+    scaling_parser = benchmarks.add_parser("scaling", help="measure training and generation on corpora of growing size")
+    scaling_parser.add_argument("--sizes", type=positive_int, nargs="+", default=DEFAULT_SIZES, metavar="WORDS",
+                                help="numbers of words of the synthetic corpora (default: %(default)s)")
+    scaling_parser.add_argument("--orders", type=positive_int, nargs="+", default=list(range(1, 7)), metavar="N",
+                                help="orders of the models to train (default: 1 to 6)")
+    scaling_parser.add_argument("--sentences", type=positive_int, default=1000, metavar="M",
+                                help="number of sentences to generate (default: %(default)s)")
+    scaling_parser.add_argument("--output", default="scaling-results.json",
+                                help="JSON file to save the results to (default: %(default)s)")
+
+    compare_parser = benchmarks.add_parser("compare", help="compare the results of two scaling benchmark runs")
+    compare_parser.add_argument("old", help="results of the earlier run")
+    compare_parser.add_argument("new", help="results of the later run")
+    compare_parser.add_argument("--tolerance", type=float, default=10.0, metavar="PERCENT",
+                                help="largest slowdown of a phase that is not reported as slower (default: 10)")
+    compare_parser.add_argument("--min-seconds", type=float, default=0.05,
+                                help="shortest time of a phase that can be reported as slower (default: %(default)s)")
+
+    options = parser.parse_args()
+
+    if options.benchmark == "tokenizer":
+        benchmark_tokenizer(options.files, options.order, options.repeat)
+    elif options.benchmark == "scaling":
+        benchmark_scaling(options.sizes, options.orders, options.sentences, options.output)
+    elif options.benchmark == "compare":
+        benchmark_compare(options.old, options.new, options.tolerance, options.min_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,286 +1,1835 @@
-"""
-Programming Assignment 2 - N-Gram Language Model
-
-Roy Chung
-20210303
-CMSC 416-001
-
-ngram.py is a program that learns an N-gram language model from an arbitrary number of plain text files
-supplied by the user, whose filenames are passed in as command line arguments. To run this program,
-place plain text files from which the program will learn the n-gram language model in the same directory
-as ngram.py. To run it, type the following into the command line:
-
-ngram.py n m filename1.txt filename2.txt [...]
-
-n denotes the number of previous words taken into consideration when generating the next word. Enter a positive
-integer for this value. The greater n is, the more comprehensible the generated sentences will be.
-
-m is the number of sentences you want generated by the program. Enter a positive integer.
-
-You must supply at least one plain text file for this program to work. Valid plain text files include those
-available on the Project Gutenberg website (http://www.gutenberg.org). List the filenames as they appear downloaded
-into the same directory in which ngram.py is located.
-
-Sample run using  "Crime and Punishment," "War and Peace," and "Anna Karenina" from Project Gutenberg:
-
-%python ngram.py 5 10 pg2554.txt pg2600.txt pg1399.txt
-
-1.	Writing out on note paper in his minute hand all that he owed , he added up the amount and found that his debts
-    amounted to seventeen thousand and some odd hundreds , which he left out for the sake of .
-
-2.	You seem to find something wrong in my speaking like that about women ?
-
-3.	After a while the moving mass became agitated , someone rode past on a white horse followed by his suite , and the
-    boyish face of rostóv , breathless with excitement and hope , was the first to gallop into the village street .
-
-4.	He sat motionless , looking at the changing shadows before him .
-
-5.	Crime and punishment part i chapter i on an exceptionally hot evening early in july a young man came out of the
-    governor ’ s , as you ordered , ” answered the girl , smiling still more brightly .
-
-6.	He started a journal - - “ the epoch , ” which within a few months was also prohibited .
-
-7.	You can ’ t imagine how we felt !
-
-8.	Though pulcheria alexandrovna felt that the young man was very glad to die .
-
-9.	Though lebeziatnikov was so good - natured , pale , young face to look back .
-
-10.	You must have pity , sir , on the children .
-
-
-This task was accomplished by converting the text of the files into tokens (words, numbers, punctuation marks -
-everything except for spaces), adding <start> and <end> tokens to the beginnings and ends, respectively, of sentences,
-and organizing those tokens into ngrams. The frequency of ngrams and words are calculated by the program, and the next
-word is generated semi-randomly with consideration to its relative probability of being the next word given the context.
-Words with 0 probability given the plain text files should not occur, while those with higher probability of occurring
-are more likely to be generated.
-"""
-
-from sys import argv
-import re
-import random
-from random import random
-
-def print_project_description():
-    print("This program generates random sentences based on an Ngram model.")
-
-
-# Reads arguments from the command line and processes the information.
-# Reads text files specified by command line arguments and returns them as tokens and ngrams
-def import_data():
-    tokens, ngrams = [], []
-    # If there are less than 4 arguments, return an error and exit the program
-    if len(argv) < 4:
-        print("Invalid command line argument. Please enter ngram.py n m input_file1.txt input_file2.txt....\n"
-              "n: n-gram\n"
-              "m: number of sentences to generate\n"
-              "input_fileX.txt: at least 1 plain text file from which the program will learn an N-gram language model.")
-        exit()
-
-    n = int(argv[1])
-    m = int(argv[2])
-
-    # If n is less than 1, return an error and exit the program
-    if n < 1:
-        print("n should be greater than 0.")
-        exit()
-
-    # If n is less than 1, return an error and exit the program
-    if m < 1:
-        print("m should be greater than 0.")
-        exit()
-
-    # Output command line arguments
-    print("Command line settings: ngram.py " + ' '.join([str(elem) for elem in argv[1:]]))
-
-    for files in argv[3:]:
-        with open(files, errors='ignore', encoding='utf-8-sig') as file:
-            sentence_tokens = get_sentence_tokens(file.read())  # tokenize the text to sentences
-            for sentence in sentence_tokens:
-                # extract words from sentence as candidate tokens
-                candidate_tokens = get_word_tokens(sentence, n)
-
-                # Discard candidate tokens if sentence length is smaller than n-2
-                # (n-2 accounts for (n-1)*<start> and <end> tokens)
-                if len(candidate_tokens) - n - 2 >= n:
-                    ngrams += generate_ngrams(n, candidate_tokens)
-                    for token in candidate_tokens:
-                        tokens.append(token)
-
-    return n, m, tokens, ngrams
-
-
-# Returns the contents of a list as a string with elements delineated by spaces
-def list_to_string(lst):
-    string = " "
-    return string.join(lst)
-
-
-# Function for converting pre-processed sentences into tokens
-def get_word_tokens(sentence, n):
-    # Add spaces, which serve as delimiters, around punctuation marks, so punctuation marks become tokens
-    tokens = re.findall(r"[\w]+|[^\s\w]", sentence)
-    # Insert <start> to the beginning of the list n-1 times
-    for i in range(n-1):
-        tokens.insert(0, "<start>")
-    # Append <end> tag to the end of the list
-    tokens.append("<end>")
-
-    return tokens
-
-
-# Function for extracting sentence tokens from text
-def get_sentence_tokens(text):
-    text = text.lower()  # Convert text to lowercase
-    text = text.replace("\n", " ")
-    tokens = re.split(r"(?<=[\.\!\?])\s*", text)  # split sentence where ., !, and ? are found
-    tokens = [i for i in tokens if i]  # remove empty strings from list
-    return tokens
-
-
-# Receives tokens and integer n and creates ngrams with zip function
-def generate_ngrams(n, tokens):
-    ngrams = zip(*[tokens[i:] for i in range(n)])
-    return [" ".join(ngram) for ngram in ngrams]
-
-
-# Iterates through list of ngrams and returns the relative frequency distribution table for words in relation to
-# words/phrases preceding to them.
-def get_num_freq_dist(ngrams, n):
-    freq_dist = {}
-
-    for i in range(0, len(ngrams)):
-        word = str(ngrams[i].split()[n - 1])
-        context = list_to_string(ngrams[i].split()[:(n - 1)])
-        # Increment frequency of context if context already exists in freq_dist
-        if context in freq_dist:
-            if word in freq_dist[context]:
-                freq_dist[context][word] += 1
-            else:
-                freq_dist[context][word] = {}
-                freq_dist[context][word] = 1
-        # If context does not yet exist in freq_dist, initialize it and set to 1
-        else:
-            freq_dist[context] = {}
-            freq_dist[context][word] = {}
-            freq_dist[context][word] = 1
-
-    return freq_dist
-
-
-# Iterates through list of ngrams and returns the frequency distribution table for words/phrases preceding candidate
-# words.
-def get_dem_freq_dist(ngrams, n):
-    freq_dist = {}
-
-    for i in range(0, len(ngrams)):
-        context = list_to_string(ngrams[i].split()[:(n - 1)])
-        # Increment frequency of context if context already exists in freq_dist
-        if context in freq_dist:
-            freq_dist[context] += 1
-        # If context does not yet exist in freq_dist, initialize it and set to 1
-        else:
-            freq_dist[context] = {}
-            freq_dist[context] = 1
-    return freq_dist
-
-
-# Sentence generator specifically for unigrams, since Markov's Assumption cannot be applied
-def generate_unigram_sentence(word_total, word_freq):
-    sentence = ""
-    ngram_array = [" "]
-
-    # Runs until <end> marker is reached
-    while "<end>" not in ngram_array:
-        total = 0
-        for word in word_freq:
-            prob = word_freq[word] / word_total
-            total += prob
-            if random() < total:
-                sentence = sentence + ngram_array.pop(0) + " "
-                ngram_array.append(word)
-
-                if "<end>" in ngram_array:
-                    sentence += " ".join(ngram_array)
-                break
-
-    sentence = sentence.replace(" <end>", ".")
-
-    # remove non-alphanumeric leading characters
-    while not sentence[0].isalpha():
-        sentence = sentence[1:]
-
-    return sentence.capitalize()
-
-
-# Sentences are generated by calculating the probability of the next word based on the preceding words in accordance to
-# Markov's Assumption. A random number between 0 and 1 is generated, which determines the next word in the sentence.
-# This process continues until an <end> marker is reached.
-def generate_sentence(n, num_freq_dist, dem_freq_dist):
-    sentence = ""
-    ngram_list = []
-
-    for n in range(0, (n - 1)):
-        ngram_list.append("<start>")
-
-    # Runs until <end> marker is reached
-    while "<end>" not in ngram_list:
-        context = " ".join(ngram_list)
-        word_freq = num_freq_dist[context]
-        total = 0
-        for word in word_freq:
-            prob = word_freq[word] / dem_freq_dist[context]
-            total += prob
-            if random() < total:
-                sentence = sentence + ngram_list.pop(0) + " "
-                ngram_list.append(word)
-
-                if "<end>" in ngram_list:
-                    sentence += " ".join(ngram_list)
-                break
-
-    sentence = sentence.replace("<start>", " ")
-    sentence = sentence.replace(" <end>", "")
-
-    # remove non-alphanumeric leading characters
-    while not sentence[0].isalpha():
-        sentence = sentence[1:]
-
-    return sentence.capitalize()
-
-
-def main():
-    print_project_description()
-
-    # receive n, m, tokens, and ngrams from import_data()
-    n, m, tokens, ngrams = import_data()
-
-    # print(tokens)
-    # print(ngrams)
-
-    # ==================== UNIGRAM ====================
-    if n == 1:
-        word_freq = {}
-        for each in ngrams:
-            if each in word_freq:
-                word_freq[each] += 1
-                continue
-            word_freq[each] = 1
-
-        word_total = sum(word_freq.values()) - word_freq["<end>"]
-
-        for m in range(0, m):
-            sentence = generate_unigram_sentence(word_total, word_freq)
-            print(str(m+1) + ".\t" + sentence)
-    # ====================  NGRAM  ====================
-    elif n > 1:
-        num_freq_dist = get_num_freq_dist(ngrams, n)
-        dem_freq_dist = get_dem_freq_dist(ngrams, n)
-        for m in range(0, m):
-            sentence = generate_sentence(n, num_freq_dist, dem_freq_dist)
-            print(str(m+1) + ".\t" + sentence)
-
-
-if __name__ == "__main__":
-    main()
+"""
+Programming Assignment 2 - N-Gram Language Model
+
+Roy Chung
+20210303
+CMSC 416-001
+
+ngram.py is a program that learns an N-gram language model from an arbitrary number of plain text files
+supplied by the user, whose filenames are passed in as command line arguments. To run this program,
+place plain text files from which the program will learn the n-gram language model in the same directory
+as ngram.py. To run it, type the following into the command line:
+
+ngram.py n m filename1.txt filename2.txt [...]
+
+n denotes the number of previous words taken into consideration when generating the next word. Enter a positive
+integer for this value. The greater n is, the more comprehensible the generated sentences will be.
+
+m is the number of sentences you want generated by the program. Enter a positive integer.
+
+You must supply at least one plain text file for this program to work. Valid plain text files include those
+available on the Project Gutenberg website (http://www.gutenberg.org). List the filenames as they appear downloaded
+into the same directory in which ngram.py is located.
+
+To avoid learning the model again on every run, the model can be saved to a binary model file once and then used
+to generate sentences as many times as needed:
+
+ngram.py train N model.bin filename1.txt filename2.txt [...]
+ngram.py generate [--order n] [--seed s] model.bin m
+
+A saved model holds the ngrams of every order from 1 to N, so sentences can be generated with any n up to N
+without learning the model again. With --seed, the same sentences are generated on every run. With --workers k,
+sentences are generated by k processes in parallel, and with --vectorized, many sentences are advanced at once
+with NumPy. With --prefix "text", every sentence begins with the given text, which is continued from the longest
+part of it that the model has seen.
+
+The model can also be used from other Python programs:
+
+    model = NgramModel.load("model.bin")
+    generator = SentenceGenerator(model, n=3, seed=42)
+    for sentence in generator:  # sentences are generated lazily
+        ...
+
+When training on several files, use --workers k to count them in parallel with k processes. For corpora too large to
+count in memory, use --memory mb to count in a single process that spills partial counts to temporary files whenever
+they take more than about mb megabytes.
+
+To trade some fidelity for a smaller model, ngrams of 2 or more words seen fewer than a threshold number of times can
+be left out, either while training with --prune threshold or afterwards with:
+
+ngram.py prune model.bin pruned.bin threshold
+
+Text from new files can be added to a saved model without reading the files it was trained on again:
+
+ngram.py update model.bin filename1.txt filename2.txt [...]
+
+The model file is left as it is: the counts of the new files go to a delta file next to it (model.bin.delta), which
+is loaded with the model and consulted along with it, so an update takes time in proportion to the new text rather
+than to the model. Sentences and scores are the same as those of the model trained on every file. After many updates,
+the delta can be merged into the model file, which takes time in proportion to the whole model:
+
+ngram.py compact model.bin
+
+To judge a model by the numbers rather than by reading its sentences, it can score held-out text it was not trained
+on. The score command prints the log probability the model gives the text and its perplexity, for every order in the
+model or only for the one given with --order. Probabilities are smoothed so that unseen ngrams and unknown words do
+not make the probability of the text 0:
+
+ngram.py score model.bin heldout.txt
+
+To answer many requests for sentences without starting the program for each of them, the model can be served over
+HTTP on a localhost port (8000 by default, or --port) or on a Unix socket given with --socket. With --train N and a
+list of files, the model is learned and saved first:
+
+ngram.py serve model.bin
+curl "http://127.0.0.1:8000/generate?m=3&n=2&seed=1"
+curl "http://127.0.0.1:8000/stats"
+
+/generate takes the number of sentences m and optionally n, seed, prefix and max_words, as in the generate command,
+and /stats reports the number of requests served and their latency.
+
+Sample run using  "Crime and Punishment," "War and Peace," and "Anna Karenina" from Project Gutenberg:
+
+%python ngram.py 5 10 pg2554.txt pg2600.txt pg1399.txt
+
+1.	Writing out on note paper in his minute hand all that he owed , he added up the amount and found that his debts
+    amounted to seventeen thousand and some odd hundreds , which he left out for the sake of .
+
+2.	You seem to find something wrong in my speaking like that about women ?
+
+3.	After a while the moving mass became agitated , someone rode past on a white horse followed by his suite , and the
+    boyish face of rostóv , breathless with excitement and hope , was the first to gallop into the village street .
+
+4.	He sat motionless , looking at the changing shadows before him .
+
+5.	Crime and punishment part i chapter i on an exceptionally hot evening early in july a young man came out of the
+    governor ’ s , as you ordered , ” answered the girl , smiling still more brightly .
+
+6.	He started a journal - - “ the epoch , ” which within a few months was also prohibited .
+
+7.	You can ’ t imagine how we felt !
+
+8.	Though pulcheria alexandrovna felt that the young man was very glad to die .
+
+9.	Though lebeziatnikov was so good - natured , pale , young face to look back .
+
+10.	You must have pity , sir , on the children .
+
+
+This task was accomplished by converting the text of the files into tokens (words, numbers, punctuation marks -
+everything except for spaces), adding <start> and <end> tokens to the beginnings and ends, respectively, of sentences,
+and organizing those tokens into ngrams. The frequency of ngrams and words are calculated by the program, and the next
+word is generated semi-randomly with consideration to its relative probability of being the next word given the context.
+Words with 0 probability given the plain text files should not occur, while those with higher probability of occurring
+are more likely to be generated.
+"""
+
+from sys import argv
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain, islice, repeat
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import asyncio
+import heapq
+import json
+import mmap
+import os
+import re
+import signal
+import struct
+import tempfile
+from random import Random, random
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+START = "<start>"
+END = "<end>"
+
+
+def print_project_description():
+    print("This program generates random sentences based on an Ngram model.")
+
+
+# Maps every distinct token to a small integer ID so that n-grams can be stored as fixed-width tuples of integers
+# instead of space-joined strings. IDs 0 and 1 are reserved for the <start> and <end> markers.
+class Vocabulary:
+    def __init__(self, tokens=(START, END)):
+        self.ids = {}
+        self.tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    # Returns the ID of token, interning it first if it has not been seen before
+    def add(self, token):
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.ids[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+    # Returns the IDs of a list of tokens, interning the ones not seen before in the order they appear
+    def encode(self, tokens):
+        token_ids = list(map(self.ids.get, tokens))
+        if None in token_ids:
+            for i, token_id in enumerate(token_ids):
+                if token_id is None:
+                    token_ids[i] = self.add(tokens[i])
+        return token_ids
+
+    def decode(self, token_ids):
+        return [self.tokens[token_id] for token_id in token_ids]
+
+
+START_ID = 0
+END_ID = 1
+UNKNOWN_ID = -1  # stands for words of a prompt that are not in the vocabulary
+
+# Number of characters read from a text file at a time
+CHUNK_SIZE = 1 << 20
+
+# A word, or any other character that is not whitespace. This finds the same tokens as r"[\w]+|[^\s\w]", since a word
+# character never gets past the first alternative, but is faster.
+WORD_TOKEN = re.compile(r"\w+|\S")
+
+# Tokens that end a sentence
+SENTENCE_END = frozenset(".!?")
+
+# Model file header: magic, format version, maximum order, pruning threshold, vocabulary size in bytes.
+# It is followed by the number of nodes in each level of the trie.
+MODEL_HEADER = struct.Struct("=8sIIQQ")
+MODEL_MAGIC = b"NGRAMMDL"
+MODEL_VERSION = 3
+
+# Delta file header: magic, format version, maximum order, number of words and of ngrams in the model the delta belongs
+# to, size in bytes of the words the delta adds to the vocabulary. It is followed by the number of nodes in each level
+# of the delta's trie. The delta of model.bin is saved as model.bin.delta.
+DELTA_HEADER = struct.Struct("=8sIIQQQ")
+DELTA_MAGIC = b"NGRAMDLT"
+DELTA_SUFFIX = ".delta"
+
+# Estimated number of bytes taken by an entry of the count table, besides 8 bytes for each word ID of its ngram
+ENTRY_BYTES = 120
+
+# Number of ngrams in each block of a run file spilled by train_external(), and the header of each block:
+# number of ngrams, number of word IDs
+RUN_BLOCK_SIZE = 1 << 16
+RUN_BLOCK_HEADER = struct.Struct("=QQ")
+
+# Number of sentences in each group generated by a worker process of SentenceGenerator.batch()
+BATCH_SIZE = 64
+
+# Largest number of words SentenceGenerator.continue_prompt() generates by default
+MAX_CONTINUATION = 100
+
+# Number of sentences SentenceGenerator.generate_vectorized() advances at once
+VECTOR_CHAINS = 4096
+
+# Models loaded by the worker processes of SentenceGenerator.batch() and of the server, by filename
+worker_models = {}
+
+# Largest number of sentences the server generates for one request
+MAX_REQUEST_SENTENCES = 10000
+
+# Number of recent requests the latency statistics of the server are computed over
+LATENCY_SAMPLES = 10000
+
+# Reason phrases of the HTTP status codes the server responds with
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+
+# Reads arguments from the command line and processes the information.
+# Learns the ngram model from the text files specified by command line arguments
+def import_data():
+    # If there are less than 4 arguments, return an error and exit the program
+    if len(argv) < 4:
+        print("Invalid command line argument. Please enter ngram.py n m input_file1.txt input_file2.txt....\n"
+              "n: n-gram\n"
+              "m: number of sentences to generate\n"
+              "input_fileX.txt: at least 1 plain text file from which the program will learn an N-gram language model.")
+        exit()
+
+    n = int(argv[1])
+    m = int(argv[2])
+
+    # If n is less than 1, return an error and exit the program
+    if n < 1:
+        print("n should be greater than 0.")
+        exit()
+
+    # If n is less than 1, return an error and exit the program
+    if m < 1:
+        print("m should be greater than 0.")
+        exit()
+
+    # Output command line arguments
+    print("Command line settings: ngram.py " + ' '.join([str(elem) for elem in argv[1:]]))
+
+    vocab, counts = train(argv[3:], n)
+
+    return n, m, NgramModel.from_counts(n, vocab, counts)
+
+
+# Learns ngram frequencies of every order from 1 to max_order from a list of plain text files. Files are streamed
+# sentence by sentence straight into the count table, so memory use grows with the number of distinct ngrams rather
+# than the size of the corpus. New words are added to vocab, which starts out empty unless given.
+def train(filenames, max_order, vocab=None):
+    vocab = vocab or Vocabulary()
+    counts = {}
+    for token_ids, sentence_order in iter_sentence_ids(filenames, max_order, vocab):
+        count_ngrams(token_ids, sentence_order, counts)
+    return vocab, counts
+
+
+# Learns a model of every order from 1 to max_order from a list of plain text files. With more than one worker and
+# more than one file, the files are counted in parallel by train_parallel(), and otherwise by train() in this process.
+def train_model(filenames, max_order, workers=1, vocab=None):
+    if workers > 1 and len(filenames) > 1:
+        return train_parallel(filenames, max_order, workers, vocab)
+    vocab, counts = train(filenames, max_order, vocab)
+    rows, freqs = count_table(counts, max_order)
+    del counts  # the table takes a fraction of the memory of the count table, which is no longer needed
+    return NgramModel.from_table(max_order, vocab, *reduce_table(rows, freqs, len(vocab)))
+
+
+# Learns the same model as train() followed by NgramModel.from_counts(), with a pool of worker processes that count
+# one file each. Workers send back their counts as ngram tables over their own vocabulary. The parent takes the tables
+# as they are finished, translates their word IDs and reduces them in bulk with reduce_table() whenever the tables
+# waiting add up to as many rows as the reduced table, so that a row takes part in a number of sorts that grows with
+# the logarithm of the number of files rather than with the number of files. At the end, words are given the IDs a
+# sequential run would have given them, and the trie is built from the reduced table.
+def train_parallel(filenames, max_order, workers, vocab=None):
+    vocab = vocab or Vocabulary()
+    arrival = Vocabulary()  # IDs of the words of the tables reduced so far, in the order their files were finished
+    file_tokens = [None] * len(filenames)
+    rows, freqs = np.empty((0, max_order), dtype=np.int32), np.empty(0, dtype=np.int64)
+    waiting = []
+
+    with ProcessPoolExecutor(min(workers, len(filenames))) as executor:
+        futures = {executor.submit(count_file, filename, max_order): i for i, filename in enumerate(filenames)}
+        for future in as_completed(futures):
+            tokens, file_rows, file_freqs = future.result()
+            file_tokens[futures.pop(future)] = tokens
+            del future
+            waiting.append((translate_rows(file_rows, arrival.encode(tokens)), file_freqs))
+            # The tables still waiting once every file is counted are reduced once, after their IDs are final
+            if futures and sum(len(table_freqs) for table_rows, table_freqs in waiting) >= len(freqs):
+                waiting.append((rows, freqs))
+                rows, freqs = reduce_table(np.concatenate([table_rows for table_rows, table_freqs in waiting]),
+                                           np.concatenate([table_freqs for table_rows, table_freqs in waiting]),
+                                           len(arrival))
+                waiting.clear()
+
+    # Words are numbered in the order of the files, so they receive the same IDs as in a sequential run
+    for tokens in file_tokens:
+        vocab.encode(tokens)
+    final_ids = vocab.encode(arrival.tokens)
+    waiting.append((rows, freqs))
+    rows = np.concatenate([translate_rows(table_rows, final_ids) for table_rows, table_freqs in waiting])
+    rows, freqs = reduce_table(rows, np.concatenate([table_freqs for table_rows, table_freqs in waiting]), len(vocab))
+    return NgramModel.from_table(max_order, vocab, rows, freqs)
+
+
+# Computes how well the model of order n predicts the text of held-out files, by the probability it gives every word
+# and sentence end in them. Sentences are split and tokenized as in training, but all of them are scored, and words
+# outside the vocabulary are scored as one unknown word. Each chunk of a file is scored at once: its padded sentences
+# are laid end to end and every token other than <start> is scored with the n-1 tokens before it as its context.
+def score(model, filenames, n=None):
+    n = n or model.max_order
+    padding = [START_ID] * (n - 1)
+    sentences = tokens = unknown = 0
+    log_prob = 0.0
+
+    for filename in filenames:
+        for chunk_tokens, ends in read_tokens(filename):
+            # A chunk without a sentence end holds no complete sentence to score
+            if not ends:
+                continue
+            token_ids = list(map(model.vocab.ids.get, chunk_tokens, repeat(UNKNOWN_ID)))
+            sequence = []
+            start = 0
+            for end in ends:
+                sequence += padding
+                sequence += token_ids[start:end]
+                sequence.append(END_ID)
+                start = end
+
+            sequence = np.array(sequence, dtype=np.int64)
+            ngrams = sliding_window_view(sequence, n)[sequence[n - 1:] != START_ID]
+            probs = model.probabilities(ngrams[:, :-1], ngrams[:, -1])
+            sentences += len(ends)
+            tokens += len(ngrams)
+            unknown += int(np.count_nonzero(ngrams[:, -1] == UNKNOWN_ID))
+            log_prob += float(np.log10(probs).sum())
+
+    perplexity = 10 ** (-log_prob / tokens) if tokens else float('nan')
+    return Score(sentences, tokens, unknown, log_prob, perplexity)
+
+
+# Adds the text of new files to a model without learning it again from the files it was trained on, and returns the
+# model. Only the new files are read and counted, into a trie of their own that is merged with the delta of earlier
+# updates, if the model has one, and becomes its delta. The model's own trie is neither read in full nor changed, so
+# the cost depends on the size of the new text and of the delta, not on the size of the model. New words are appended
+# to the vocabulary, and the model then gives the same probabilities and sentences as the model learned from the
+# original files followed by the new ones, which compact() returns.
+def update(model, filenames, workers=1):
+    if model.prune_threshold > 1:
+        raise ValueError("A pruned model has lost the counts needed to update it exactly.")
+    trie = train_model(filenames, model.max_order, workers, Vocabulary(model.vocab.tokens))
+    if model.delta is None:
+        base_words = len(model.vocab)
+    else:
+        trie = model.delta.trie.merge(trie)
+        base_words = model.delta.base_words
+    model.attach_delta(Delta(trie, model.find_fresh(trie), base_words))
+    return model
+
+
+# Learns the same model as train() followed by NgramModel.from_counts(), for corpora whose count table does not fit
+# in memory. Whenever the count table grows past roughly memory_limit bytes, it is sorted and spilled to a temporary
+# run file, and counting carries on with an empty table. The sorted runs are then merged, k ways at once, straight
+# into the trie.
+def train_external(filenames, max_order, memory_limit, temp_dir=None):
+    vocab = Vocabulary()
+    counts = {}
+    max_entries = max(1, memory_limit // (ENTRY_BYTES + 8 * max_order))
+
+    with tempfile.TemporaryDirectory(prefix="ngram-runs-", dir=temp_dir) as run_dir:
+        runs = []
+        for token_ids, sentence_order in iter_sentence_ids(filenames, max_order, vocab):
+            count_ngrams(token_ids, sentence_order, counts)
+            if len(counts) >= max_entries:
+                runs.append(write_run(counts, os.path.join(run_dir, str(len(runs)))))
+                counts.clear()
+        if counts:
+            runs.append(write_run(counts, os.path.join(run_dir, str(len(runs)))))
+            counts.clear()
+
+        return NgramModel.build(max_order, vocab, merge_runs([read_run(run) for run in runs]))
+
+
+# Writes a count table to a run file, sorted by ngram, and returns the file's name. The file is a series of blocks,
+# each holding up to RUN_BLOCK_SIZE ngrams as a header and three arrays: the lengths of the ngrams, their frequencies,
+# and the word IDs of all of them.
+def write_run(counts, filename):
+    ngrams = sorted(counts)
+    with open(filename, 'wb') as file:
+        for i in range(0, len(ngrams), RUN_BLOCK_SIZE):
+            block = ngrams[i:i + RUN_BLOCK_SIZE]
+            lengths = array('b', map(len, block))
+            freqs = array('q', [counts[ngram] for ngram in block])
+            ids = array('i', chain.from_iterable(block))
+            file.write(RUN_BLOCK_HEADER.pack(len(block), len(ids)))
+            lengths.tofile(file)
+            freqs.tofile(file)
+            ids.tofile(file)
+    return filename
+
+
+# Yields the (ngram, frequency) pairs of a run file in order, reading one block at a time
+def read_run(filename):
+    with open(filename, 'rb') as file:
+        header = file.read(RUN_BLOCK_HEADER.size)
+        while header:
+            num_ngrams, num_ids = RUN_BLOCK_HEADER.unpack(header)
+            lengths, freqs, ids = array('b'), array('q'), array('i')
+            lengths.fromfile(file, num_ngrams)
+            freqs.fromfile(file, num_ngrams)
+            ids.fromfile(file, num_ids)
+
+            start = 0
+            for length, freq in zip(lengths, freqs):
+                yield tuple(ids[start:start + length]), freq
+                start += length
+            header = file.read(RUN_BLOCK_HEADER.size)
+
+
+# Merges sorted streams of (ngram, frequency) pairs into one sorted stream, adding up the frequencies of an ngram that
+# appears in more than one of them
+def merge_runs(runs):
+    current, total = None, 0
+    for ngram, freq in heapq.merge(*runs):
+        if ngram == current:
+            total += freq
+            continue
+        if current is not None:
+            yield current, total
+        current, total = ngram, freq
+    if current is not None:
+        yield current, total
+
+
+# Counts the ngrams of a single file in a worker process. The counts are sent back to the parent as the file's own
+# vocabulary and an ngram table, so the parent receives one string per distinct word rather than one per ngram.
+def count_file(filename, max_order):
+    vocab, counts = train([filename], max_order)
+    return vocab.tokens, *count_table(counts, max_order)
+
+
+# Converts a count table into an ngram table: an array with one ngram per row, padded after its last word with -1, and
+# the array of their frequencies
+def count_table(counts, max_order):
+    size = len(counts)
+    lengths = np.fromiter(map(len, counts), dtype=np.int64, count=size)
+    word_ids = np.fromiter(chain.from_iterable(counts), dtype=np.int32, count=int(lengths.sum()))
+    rows = np.full((size, max_order), -1, dtype=np.int32)
+    # A mask assignment fills the masked cells row by row, which is the order of the word IDs
+    rows[np.arange(max_order) < lengths[:, None]] = word_ids
+    return rows, np.fromiter(counts.values(), dtype=np.int64, count=size)
+
+
+# Replaces the word IDs of an ngram table by the IDs found at those positions of new_ids, keeping the -1 padding
+def translate_rows(rows, new_ids):
+    return np.append(np.array(new_ids, dtype=np.int32), np.int32(-1))[rows]
+
+
+# Sorts the rows of an ngram table whose word IDs are below vocab_size by ngram and adds up the frequencies of
+# repeated ngrams. Ngrams sort like the tuples they stand for, since the -1 padding comes before every word ID. The
+# word IDs of a row are packed into as few 64-bit keys as their number of bits allows, so that NumPy sorts by a few
+# keys rather than by every column.
+def reduce_table(rows, freqs, vocab_size):
+    bits = vocab_size.bit_length()
+    per_key = max(1, 63 // bits)
+    keys = []
+    for column in range(0, rows.shape[1], per_key):
+        key = np.zeros(len(rows), dtype=np.int64)
+        for word_ids in rows.T[column:column + per_key]:
+            key = (key << bits) | (word_ids.astype(np.int64) + 1)
+        keys.append(key)
+
+    order = np.lexsort(keys[::-1])
+    rows, freqs = rows[order], freqs[order]
+    first = np.zeros(len(rows), dtype=bool)
+    first[:1] = True
+    for key in keys:
+        key = key[order]
+        first[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(first)
+    if not len(starts):
+        return rows, freqs
+    return rows[starts], np.add.reduceat(freqs, starts)
+
+
+# Yields the padded, integer-encoded tokens of every sentence in the given files that is long enough to learn from,
+# along with the highest ngram order the sentence is long enough to be learned at. The words of the kept sentences
+# of a whole chunk are encoded at once, and padding is added to each sentence by a single list concatenation.
+def iter_sentence_ids(filenames, max_order, vocab):
+    padding = [START_ID] * (max_order - 1)
+    for filename in filenames:
+        for tokens, ends in read_tokens(filename):
+            # For each order n, discard the sentence if it has fewer than n+2 words
+            kept_tokens, lengths = [], []
+            start = 0
+            for end in ends:
+                if end - start >= 3:
+                    kept_tokens += tokens[start:end]
+                    lengths.append(end - start)
+                start = end
+
+            token_ids = vocab.encode(kept_tokens)
+            start = 0
+            for length in lengths:
+                sentence_ids = padding + token_ids[start:start + length]
+                sentence_ids.append(END_ID)
+                yield sentence_ids, min(max_order, length - 2)
+                start += length
+
+
+# Reads a text file chunk by chunk and yields the lowercased tokens of the sentences in each chunk as one flat list,
+# along with the position in it where each sentence ends. A whole chunk is tokenized by one regular expression search,
+# and sentences end after every ., ! or ? token. The text after the last of these in a chunk is carried over to the
+# next one, so a sentence split across chunks is read whole.
+def read_tokens(filename, chunk_size=CHUNK_SIZE):
+    carry = ""
+    with open(filename, errors='ignore', encoding='utf-8-sig') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            text = carry + chunk.lower()
+            end = max(text.rfind("."), text.rfind("!"), text.rfind("?")) + 1
+            carry = text[end:]
+            tokens = WORD_TOKEN.findall(text, 0, end)
+            yield tokens, [i + 1 for i, token in enumerate(tokens) if token in SENTENCE_END]
+
+    tokens = WORD_TOKEN.findall(carry)
+    if tokens:
+        yield tokens, [len(tokens)]
+
+
+# Counts the ngrams of an integer-encoded, padded sentence. For every position, only the sequence of the next
+# sentence_order tokens is counted, as it stands for all of its prefixes: the frequency of an ngram of any order is
+# the total frequency of the sequences that begin with it. NgramModel adds these up when it builds its trie.
+def count_ngrams(token_ids, sentence_order, counts):
+    for i in range(len(token_ids)):
+        ngram = tuple(token_ids[i:i + sentence_order])
+        counts[ngram] = counts.get(ngram, 0) + 1
+
+
+# Converts generated word IDs back into a printable sentence
+def ids_to_sentence(vocab, word_ids):
+    return tokens_to_sentence(vocab.decode(word_ids))
+
+
+# Converts generated tokens into a printable sentence
+def tokens_to_sentence(tokens):
+    sentence = " ".join(tokens)
+
+    # remove non-alphanumeric leading characters
+    while sentence and not sentence[0].isalpha():
+        sentence = sentence[1:]
+
+    return sentence.capitalize()
+
+
+# An ngram model of every order from 1 to max_order, stored as a counting trie whose levels are flat arrays. This is
+# also the form in which it is saved to and memory-mapped from disk.
+# Level d holds one node per distinct ngram of d+1 words, sorted by ngram. Node j of level d has the word ID ids[d][j]
+# and its children (the ngrams extending it by one word) occupy starts[d][j]:starts[d][j+1] of level d+1, while the
+# nodes of level 0 are the children of the empty context. ngrams of different orders therefore share their prefixes.
+# cumulative[d][j] is the running total of the frequencies of node j and the siblings before it, so the successors of
+# a context are found by descending the trie and drawn by bisecting the cumulative frequencies of its children.
+class NgramModel:
+    def __init__(self, max_order, vocab, ids, cumulative, starts, prune_threshold=0, buffer=None):
+        self.max_order = max_order
+        self.vocab = vocab
+        self.ids = ids
+        self.cumulative = cumulative
+        self.starts = starts
+        self.prune_threshold = prune_threshold  # ngrams of 2 or more words rarer than this were left out
+        self.buffer = buffer  # memory map backing the arrays of a loaded model
+        self.filename = None  # file a loaded model was loaded from
+        self.index = None  # NumPy views of the arrays, built on first use by numpy_index()
+        self.delta = None  # counts added by update() since the model was saved in full
+        self.delta_distinct = None  # running counts of the delta's new successors, built on first use
+
+    # Builds the trie from the count table produced by train()
+    @classmethod
+    def from_counts(cls, max_order, vocab, counts):
+        return cls.from_table(max_order, vocab, *reduce_table(*count_table(counts, max_order), len(vocab)))
+
+    # Builds the same trie as build() with NumPy, from an ngram table sorted by ngram without repeats, as returned by
+    # reduce_table(). The rows holding the ngrams that pass through a node are next to each other, so the nodes of
+    # level d are the rows whose first d+1 words differ from those of the row before, and the frequency of a node is
+    # the total of its rows. Nodes whose ngram is made up only of <start> tokens keep a frequency of 0.
+    @classmethod
+    def from_table(cls, max_order, vocab, rows, freqs):
+        ids, cumulative, starts = [], [], []
+        changed = np.zeros(len(rows), dtype=bool)  # whether the first d+1 words of each row differ from the row before
+        changed[:1] = True
+        padding = np.ones(len(rows), dtype=bool)  # whether the first d+1 words of each row are all <start>
+        for d in range(max_order):
+            words = rows[:, d]
+            changed[1:] |= words[1:] != words[:-1]
+            padding &= words == START_ID
+            valid = words >= 0
+            first = changed & valid
+            node = np.cumsum(first) - 1  # node of level d each row passes through
+            node_freqs = np.where(padding, 0, freqs)[valid]
+            if len(node_freqs):
+                node_freqs = np.add.reduceat(node_freqs, np.flatnonzero(first[valid]))
+
+            # Offsets of each node's children in this level, and running totals within each group of siblings
+            if d:
+                parents = parent_node[first]
+                level_starts = np.concatenate(([0], np.cumsum(np.bincount(parents, minlength=len(ids[-1])))))
+                group_starts = level_starts[parents]
+                starts.append(to_array('q', level_starts))
+            else:
+                group_starts = np.zeros(len(node_freqs), dtype=np.int64)
+            totals = np.cumsum(node_freqs)
+            cumulative.append(to_array('q', totals - totals[group_starts] + node_freqs[group_starts]))
+            ids.append(to_array('i', words[first]))
+            parent_node = node
+
+        return cls(max_order, vocab, ids, cumulative, starts)
+
+    # Builds the trie in a single pass over (ngram, frequency) pairs sorted by ngram, which visits the nodes in
+    # depth-first order. A node is created the first time a sequence passes through it, the frequency of every
+    # sequence is added to all of its prefixes, and a node's running total is final once the sequences have moved
+    # past it. Prefixes made up only of <start> tokens never occur in a sentence padded for their own order, so they
+    # keep a frequency of 0.
+    @classmethod
+    def build(cls, max_order, vocab, items, prune_threshold=0):
+        ids = [array('i') for d in range(max_order)]
+        cumulative = [array('q') for d in range(max_order)]
+        starts = [array('q') for d in range(max_order - 1)]
+        pending = [0] * max_order  # frequency of the open node of each level
+        totals = [0] * max_order  # running total of the closed siblings of the open node of each level
+        path = ()
+
+        for ngram, freq in items:
+            length = len(ngram)
+            common = 0
+            limit = min(length, len(path))
+            while common < limit and path[common] == ngram[common]:
+                common += 1
+
+            # Close the nodes of the previous path that this ngram does not pass through
+            for d in range(len(path) - 1, common - 1, -1):
+                totals[d] += pending[d]
+                cumulative[d].append(totals[d])
+
+            # Open the nodes this ngram adds to the trie
+            for d in range(common, length):
+                ids[d].append(ngram[d])
+                pending[d] = 0
+                if d < max_order - 1:
+                    starts[d].append(len(ids[d + 1]))
+                    totals[d + 1] = 0
+            path = ngram
+
+            padding = 0
+            if ngram[0] == START_ID:
+                while padding < length and ngram[padding] == START_ID:
+                    padding += 1
+            for d in range(padding, length):
+                pending[d] += freq
+
+        for d in range(len(path) - 1, -1, -1):
+            totals[d] += pending[d]
+            cumulative[d].append(totals[d])
+        for d in range(max_order - 1):
+            starts[d].append(len(ids[d + 1]))
+
+        return cls(max_order, vocab, ids, cumulative, starts, prune_threshold)
+
+    # Memory-maps a model file written by save(). Only the vocabulary is copied into memory, so loading is fast and
+    # processes that load the same file share its pages through the operating system's page cache.
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, max_order, prune_threshold, vocab_size = MODEL_HEADER.unpack_from(buffer)
+        if magic != MODEL_MAGIC or version != MODEL_VERSION:
+            buffer.close()
+            raise ValueError(filename + " is not a compatible ngram model file.")
+        level_sizes = struct.unpack_from("=" + str(max_order) + "Q", buffer, MODEL_HEADER.size)
+        section = section_reader(buffer, MODEL_HEADER.size + 8 * max_order)
+        vocab = Vocabulary(bytes(section('B', vocab_size)).decode('utf-8').split("\n"))
+        ids = [section('i', size) for size in level_sizes]
+        cumulative = [section('q', size) for size in level_sizes]
+        starts = [section('q', size + 1) for size in level_sizes[:-1]]
+        model = cls(max_order, vocab, ids, cumulative, starts, prune_threshold, buffer)
+        model.filename = filename
+        if os.path.exists(filename + DELTA_SUFFIX):
+            model.attach_delta(model.load_delta(filename + DELTA_SUFFIX))
+        return model
+
+    # Memory-maps a delta file written by save_delta() for this model, and returns the delta
+    def load_delta(self, filename):
+        with open(filename, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, max_order, base_words, base_nodes, words_size = DELTA_HEADER.unpack_from(buffer)
+        if magic != DELTA_MAGIC or version != MODEL_VERSION or max_order != self.max_order or \
+                base_words != len(self.vocab) or base_nodes != sum(len(level) for level in self.ids):
+            buffer.close()
+            raise ValueError(filename + " is not a delta of the model in " + str(self.filename) + ".")
+        level_sizes = struct.unpack_from("=" + str(max_order) + "Q", buffer, DELTA_HEADER.size)
+        section = section_reader(buffer, DELTA_HEADER.size + 8 * max_order)
+        words = bytes(section('B', words_size)).decode('utf-8').split("\n") if words_size else []
+        vocab = Vocabulary(self.vocab.tokens + words)
+        ids = [section('i', size) for size in level_sizes]
+        cumulative = [section('q', size) for size in level_sizes]
+        starts = [section('q', size + 1) for size in level_sizes[:-1]]
+        fresh = [section('B', size) for size in level_sizes]
+        return Delta(NgramModel(max_order, vocab, ids, cumulative, starts, 0, buffer), fresh, base_words)
+
+    # Writes the model to a binary file: a fixed header, the number of nodes in each level, the newline-separated
+    # vocabulary, and the arrays of every level. Every section is padded to a multiple of 8 bytes so the arrays can be
+    # used in place once memory-mapped. Numbers are stored in the machine's native byte order. A model with a delta is
+    # compacted first, and a delta left next to an earlier file of the same name is removed, since it belongs to that
+    # file.
+    def save(self, filename):
+        if self.delta is not None:
+            self.compact().save(filename)
+            return
+        vocab_bytes = "\n".join(self.vocab.tokens).encode('utf-8')
+        with open(filename, 'wb') as file:
+            file.write(MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, self.max_order, self.prune_threshold,
+                                         len(vocab_bytes)))
+            file.write(struct.pack("=" + str(self.max_order) + "Q", *[len(level) for level in self.ids]))
+            write_sections(file, [vocab_bytes] + self.ids + self.cumulative + self.starts)
+        if os.path.exists(filename + DELTA_SUFFIX):
+            os.remove(filename + DELTA_SUFFIX)
+
+    # Writes the delta of the model to a binary file laid out like those of save(), which holds only the words the
+    # delta adds to the vocabulary, and after the arrays of the delta's trie, the fresh flags of its nodes
+    def save_delta(self, filename):
+        trie, fresh, base_words = self.delta
+        words = "\n".join(trie.vocab.tokens[base_words:]).encode('utf-8')
+        with open(filename, 'wb') as file:
+            file.write(DELTA_HEADER.pack(DELTA_MAGIC, MODEL_VERSION, self.max_order, base_words,
+                                         sum(len(level) for level in self.ids), len(words)))
+            file.write(struct.pack("=" + str(self.max_order) + "Q", *[len(level) for level in trie.ids]))
+            write_sections(file, [words] + trie.ids + trie.cumulative + trie.starts + fresh)
+
+    # Makes delta the delta of the model, in place of the one it had, and its vocabulary that of the model
+    def attach_delta(self, delta):
+        self.close_delta()
+        self.delta = delta
+        self.vocab = delta.trie.vocab
+        self.index = self.delta_distinct = None
+
+    # Returns the model with its delta merged into its own trie, which is the model learned from the text of every
+    # update too, or the model itself if it has no delta. The merge goes over every node of the model.
+    def compact(self):
+        if self.delta is None:
+            return self
+        return self.merge(self.delta.trie)
+
+    # Returns, for every level of trie, an array with a 1 for each node whose ngram this model's trie lacks. Every
+    # level is looked up below the nodes of the level above by search_ranges(), which only reads the entries of the
+    # model it compares, so the cost depends on the size of trie rather than on the size of the model.
+    def find_fresh(self, trie):
+        fresh = []
+        for d in range(self.max_order):
+            ids = np.frombuffer(self.ids[d], dtype=np.int32)
+            words = np.frombuffer(trie.ids[d], dtype=np.int32)
+            if d:
+                sizes = np.diff(np.frombuffer(trie.starts[d - 1], dtype=np.int64))
+                parent, parent_found = np.repeat(node, sizes), np.repeat(found, sizes)
+                starts = np.frombuffer(self.starts[d - 1], dtype=np.int64)
+                last = len(starts) - 1
+                lo = np.where(parent_found, starts[np.minimum(parent, last)], 0)
+                hi = np.where(parent_found, starts[np.minimum(parent + 1, last)], 0)
+            else:
+                lo, hi = np.zeros(len(words), dtype=np.int64), np.full(len(words), len(ids), dtype=np.int64)
+            node, found = search_ranges(ids, lo, hi, words)
+            fresh.append(to_array('B', ~found))
+        return fresh
+
+    # Returns the number of distinct ngrams of every order stored in the model, counting those of its delta once
+    def num_nodes(self):
+        nodes = sum(len(level) for level in self.ids)
+        if self.delta is not None:
+            nodes += sum(int(np.count_nonzero(np.frombuffer(level, dtype=np.uint8))) for level in self.delta.fresh)
+        return nodes
+
+    # Returns the number of bytes taken by the vocabulary and the arrays of the trie and of its delta
+    def num_bytes(self):
+        arrays = self.ids + self.cumulative + self.starts
+        if self.delta is not None:
+            arrays += self.delta.trie.ids + self.delta.trie.cumulative + self.delta.trie.starts + self.delta.fresh
+        return len("\n".join(self.vocab.tokens).encode('utf-8')) + sum(memoryview(a).nbytes for a in arrays)
+
+    # Yields (ngram, frequency) pairs, sorted by ngram, from which build() recreates this model. The frequency paired
+    # with each node is its own minus that of its children, since build() adds it back up along the path.
+    # With a threshold, ngrams of 2 or more words seen fewer than threshold times are left out together with their
+    # descendants. Their frequency is kept by their parent, so the distributions of lower orders do not change.
+    def iter_ngrams(self, threshold=0):
+        return self._iter_level(0, 0, len(self.ids[0]), (), True, threshold)
+
+    # Yields the pairs for the nodes in lo:hi of level d and their descendants. padding tells whether prefix, the
+    # ngram of their parent, is made up only of <start> tokens.
+    def _iter_level(self, d, lo, hi, prefix, padding, threshold):
+        ids, cumulative = self.ids[d], self.cumulative[d]
+        previous = 0
+        for j in range(lo, hi):
+            freq = cumulative[j] - previous
+            previous = cumulative[j]
+            ngram = prefix + (ids[j],)
+            all_padding = padding and ids[j] == START_ID
+            if all_padding:
+                # Prefixes made up only of <start> tokens have no frequency of their own
+                freq = 0
+            elif d > 0 and freq < threshold:
+                continue
+
+            if d == self.max_order - 1:
+                yield ngram, freq
+                continue
+
+            child_lo, child_hi = self.starts[d][j], self.starts[d][j + 1]
+            if not all_padding:
+                freq -= self.kept_frequency(d + 1, child_lo, child_hi, threshold)
+            yield ngram, freq
+            yield from self._iter_level(d + 1, child_lo, child_hi, ngram, all_padding, threshold)
+
+    # Returns the total frequency of the nodes in lo:hi of level d that are at least as frequent as threshold
+    def kept_frequency(self, d, lo, hi, threshold):
+        cumulative = self.cumulative[d]
+        kept, previous = 0, 0
+        for j in range(lo, hi):
+            freq = cumulative[j] - previous
+            previous = cumulative[j]
+            if freq >= threshold:
+                kept += freq
+        return kept
+
+    # Returns a copy of the model without the ngrams of 2 or more words that were seen fewer than threshold times.
+    # A model with a delta is compacted first.
+    def prune(self, threshold):
+        model = self.compact()
+        return NgramModel.build(model.max_order, model.vocab, model.iter_ngrams(threshold), threshold)
+
+    # Descends the trie along context and returns the range of its successors in level len(context),
+    # or None if the context was never seen
+    def find(self, context):
+        lo, hi = 0, len(self.ids[0])
+        for d, word in enumerate(context):
+            ids = self.ids[d]
+            j = bisect_left(ids, word, lo, hi)
+            if j == hi or ids[j] != word:
+                return None
+            lo, hi = self.starts[d][j], self.starts[d][j + 1]
+        return lo, hi
+
+    # Draws the word following context with a single random number from draw(). The order of the model used is
+    # len(context)+1.
+    def sample(self, context, draw=random):
+        if self.delta is not None:
+            return self.sample_merged(context, draw, False)
+        successors = self.find_successors(context)
+        if successors is None:
+            raise KeyError(context)
+        return self.draw_successor(len(context), successors, draw)
+
+    # Draws the word following context like sample(), but if the context was never seen or all of its successors
+    # were pruned, it backs off to the longest suffix of the context that has successors
+    def sample_backoff(self, context, draw=random):
+        if self.delta is not None:
+            return self.sample_merged(context, draw, True)
+        context, successors = self.longest_context(context)
+        return self.draw_successor(len(context), successors, draw)
+
+    # sample() or, with backoff, sample_backoff() for a model with a delta. The word drawn is the one compact() would
+    # draw with the same random number: the successors of the context in both tries, taken together in order of word
+    # ID, have running totals that are those of the model's own successors plus those of the delta's up to the same
+    # word ID, and the first of them to exceed the draw is the first such successor of either trie.
+    def sample_merged(self, context, draw, backoff):
+        trie = self.delta.trie
+        for start in range(len(context) + 1 if backoff else 1):
+            suffix = context[start:]
+            d = len(suffix)
+            own, new = self.find_successors(suffix), trie.find_successors(suffix)
+            if own is None and new is None:
+                continue
+            if new is None:
+                return self.draw_successor(d, own, draw)
+            if own is None:
+                return trie.draw_successor(d, new, draw)
+            ids, cumulative, new_ids, new_cumulative = self.ids[d], self.cumulative[d], trie.ids[d], trie.cumulative[d]
+            target = draw() * (cumulative[own[1] - 1] + new_cumulative[new[1] - 1])
+            i = bisect_merged(ids, cumulative, own, new_ids, new_cumulative, new, target)
+            j = bisect_merged(new_ids, new_cumulative, new, ids, cumulative, own, target)
+            if j == new[1] or (i < own[1] and ids[i] < new_ids[j]):
+                return ids[i]
+            return new_ids[j]
+        raise KeyError(context)
+
+    # Returns the range of the successors of context, or None if the context was never seen or has no successors
+    # left after pruning
+    def find_successors(self, context):
+        successors = self.find(context)
+        if successors is None or successors[0] == successors[1]:
+            return None
+        if self.cumulative[len(context)][successors[1] - 1] == 0:
+            return None
+        return successors
+
+    # Returns the longest suffix of context that has successors, together with the range of its successors. Word IDs
+    # that are not in the vocabulary (such as -1 for unknown words) are never matched, so the suffix starts after the
+    # last of them. At most len(context)+1 lookups are made, each taking O(len(context) * log(vocabulary size)).
+    def longest_context(self, context):
+        for start in range(len(context) + 1):
+            suffix = context[start:]
+            successors = self.find_successors(suffix)
+            if successors is not None:
+                return suffix, successors
+        raise KeyError(context)
+
+    # Draws a word from the successors lo:hi of level d with a single random number
+    def draw_successor(self, d, successors, draw=random):
+        lo, hi = successors
+        cumulative = self.cumulative[d]
+        return self.ids[d][bisect_right(cumulative, draw() * cumulative[hi - 1], lo, hi)]
+
+    # Returns NumPy views of the trie used to look up and sample from many contexts at once. Within a level, nodes
+    # are sorted by (parent, word ID), so the key parent * vocabulary size + word ID is sorted across the whole level
+    # and a batch of nodes can be found with one searchsorted call. Running totals over the whole level, rather than
+    # within each group of siblings, let a batch of successors be drawn the same way.
+    def numpy_index(self):
+        if self.index is None:
+            vocab_size = len(self.vocab)
+            keys, totals, distinct = [], [], []
+            for d in range(self.max_order):
+                ids = np.frombuffer(self.ids[d], dtype=np.int32).astype(np.int64)
+                cumulative = np.frombuffer(self.cumulative[d], dtype=np.int64)
+                if d:
+                    starts = np.frombuffer(self.starts[d - 1], dtype=np.int64)
+                    sizes = np.diff(starts)
+                    keys.append(np.repeat(np.arange(len(sizes), dtype=np.int64), sizes) * vocab_size + ids)
+                    first = starts[:-1][sizes > 0]
+                else:
+                    keys.append(ids)
+                    first = np.zeros(min(len(ids), 1), dtype=np.int64)
+                freqs = np.empty_like(cumulative)
+                freqs[1:] = np.diff(cumulative)
+                freqs[first] = cumulative[first]
+                totals.append(np.cumsum(freqs))
+                distinct.append(np.cumsum(freqs > 0))
+            starts = [np.frombuffer(level, dtype=np.int64) for level in self.starts]
+            ids = [np.frombuffer(level, dtype=np.int32) for level in self.ids]
+            cumulative = [np.frombuffer(level, dtype=np.int64) for level in self.cumulative]
+            self.index = NumpyIndex(keys, totals, distinct, starts, ids, cumulative, vocab_size)
+        return self.index
+
+    # Returns a model holding the ngrams of this model and other, with the frequencies of ngrams in both added up.
+    # The vocabulary of other must extend this model's vocabulary. The tries are merged level by level: a node is
+    # identified by the key (index of its parent in the merged level above, word ID), the keys of both tries are
+    # united and sorted, and the frequencies are summed at their merged positions.
+    def merge(self, other):
+        vocab_size = len(other.vocab)
+        index, other_index = self.numpy_index(), other.numpy_index()
+        ids, cumulative, starts = [], [], []
+        parents = other_parents = None  # merged index of the parent of every node of the current level of each trie
+
+        for d in range(self.max_order):
+            if d:
+                parents = parent_map[np.repeat(np.arange(len(parent_map)), np.diff(index.starts[d - 1]))]
+                other_parents = other_parent_map[np.repeat(np.arange(len(other_parent_map)),
+                                                           np.diff(other_index.starts[d - 1]))]
+                keys = parents * vocab_size + index.ids[d]
+                other_keys = other_parents * vocab_size + other_index.ids[d]
+            else:
+                keys, other_keys = index.ids[d].astype(np.int64), other_index.ids[d].astype(np.int64)
+
+            merged_keys = np.union1d(keys, other_keys)
+            parent_map = np.searchsorted(merged_keys, keys)
+            other_parent_map = np.searchsorted(merged_keys, other_keys)
+            freqs = np.zeros(len(merged_keys), dtype=np.int64)
+            freqs[parent_map] += np.diff(index.totals[d], prepend=0)
+            freqs[other_parent_map] += np.diff(other_index.totals[d], prepend=0)
+
+            # Offsets of each node's children in this level, and running totals within each group of siblings
+            merged_parents = merged_keys // vocab_size
+            if d:
+                sizes = np.bincount(merged_parents, minlength=len(ids[-1]))
+                starts.append(np.concatenate(([0], np.cumsum(sizes))))
+                group_starts = starts[-1][merged_parents]
+            else:
+                group_starts = np.zeros(len(merged_keys), dtype=np.int64)
+            totals = np.cumsum(freqs)
+            cumulative.append(totals - totals[group_starts] + freqs[group_starts])
+            ids.append(merged_keys % vocab_size)
+
+        return NgramModel(self.max_order, other.vocab, [to_array('i', level) for level in ids],
+                          [to_array('q', level) for level in cumulative], [to_array('q', level) for level in starts])
+
+    # Finds a batch of ngrams of the same length, given as an array with one ngram per row. Returns the array of the
+    # index of each ngram's node in level length-1 and a mask of the ngrams that were found. Ngrams holding word IDs
+    # below 0, such as -1 for unknown words, are never found.
+    def locate_many(self, ngrams):
+        count, length = ngrams.shape
+        found = np.ones(count, dtype=bool)
+        node = np.zeros(count, dtype=np.int64)
+        for d in range(length):
+            node, found = self.locate_children(d, node, found, ngrams[:, d])
+        return node, found
+
+    # Finds the child with the given word of each node of level d-1 (of the root for d = 0) in level d of the trie.
+    # Only the nodes in found are looked for, and found is returned narrowed down to the children that exist. Large
+    # batches repeat the same keys many times, so each distinct key is searched for once, in sorted order.
+    def locate_children(self, d, node, found, words):
+        index = self.numpy_index()
+        keys = index.keys[d]
+        found = found & (words >= 0) & (words < index.vocab_size)
+        key = words if d == 0 else node * index.vocab_size + words
+        unique, inverse = np.unique(key, return_inverse=True)
+        node = np.minimum(np.searchsorted(keys, unique), len(keys) - 1)[inverse.reshape(-1)]
+        return node, found & (keys[node] == key)
+
+    # find() for a batch of contexts, given as an array with one context per row. Returns the arrays of the lo and hi
+    # bounds of each context's successors and a mask of the contexts that were found.
+    def find_many(self, contexts):
+        count, length = contexts.shape
+        if length == 0:
+            return (np.zeros(count, dtype=np.int64), np.full(count, len(self.ids[0]), dtype=np.int64),
+                    np.ones(count, dtype=bool))
+        starts = self.numpy_index().starts[length - 1]
+        node, found = self.locate_many(contexts)
+        return starts[node], starts[node + 1], found
+
+    # Returns the smoothed probability of each word following its context, for a batch of contexts given as an array
+    # with one context per row and the array of the words. Probabilities are smoothed by interpolated Witten-Bell
+    # smoothing: going up from a uniform distribution over the vocabulary and one unknown word, the distribution of
+    # each order is mixed with the smoothed one of the order below, which gets a weight proportional to the number of
+    # distinct words seen after the context. Contexts that were never seen leave the lower order as it is, so no word
+    # gets a probability of 0.
+    def probabilities(self, contexts, words):
+        length = contexts.shape[1]
+        # <start> is never predicted, which leaves room in the vocabulary size for the unknown word
+        probs = np.full(len(words), 1 / len(self.vocab))
+        for k in range(length + 1):
+            total, distinct, freq = self.successor_counts(contexts[:, length - k:], words)
+            if self.delta is not None:
+                # Successors in both tries are only counted once among the distinct ones
+                delta_total, delta_distinct, delta_freq = self.delta.trie.successor_counts(
+                    contexts[:, length - k:], words, self.fresh_distinct(k))
+                total, distinct, freq = total + delta_total, distinct + delta_distinct, freq + delta_freq
+
+            known = total > 0
+            probs[known] = (freq[known] + distinct[known] * probs[known]) / (total[known] + distinct[known])
+        return probs
+
+    # Returns, for a batch of contexts of length k given as an array with one context per row and the array of the
+    # words following them, the arrays of the total frequency of each context's successors, of the number of its
+    # successors with a frequency above 0 and of the frequency of the word among them. With distinct, the running
+    # count over level k of the nodes to count as successors, the nodes it counts are counted instead.
+    def successor_counts(self, contexts, words, distinct=None):
+        index = self.numpy_index()
+        k = contexts.shape[1]
+        context_node, found = self.locate_many(contexts)
+        if k:
+            lo, hi = index.starts[k - 1][context_node], index.starts[k - 1][context_node + 1]
+        else:
+            lo, hi = 0, np.full(len(words), len(self.ids[0]))
+        total = range_total(index.totals[k], lo, hi) * found
+        distinct = range_total(index.distinct[k] if distinct is None else distinct, lo, hi) * found
+
+        # Frequency of the ngram made of the context and the word, among the successors of the context
+        node, seen = self.locate_children(k, context_node, found, words)
+        freq = range_total(index.totals[k], node, node + 1) * seen
+        return total, distinct, freq
+
+    # Returns the running count over level d of the delta's trie of the nodes that have a frequency above 0 and are
+    # not in the model's own trie, which are the successors the delta adds
+    def fresh_distinct(self, d):
+        if self.delta_distinct is None:
+            index = self.delta.trie.numpy_index()
+            self.delta_distinct = [np.cumsum(np.frombuffer(fresh, dtype=np.uint8).astype(bool) &
+                                             (np.diff(distinct, prepend=0) > 0))
+                                   for fresh, distinct in zip(self.delta.fresh, index.distinct)]
+        return self.delta_distinct[d]
+
+    # sample_backoff() for a batch of contexts, given as an array with one context per row, using the matching
+    # uniform random numbers in draws. Returns an array of the drawn word IDs.
+    def sample_many(self, contexts, draws):
+        if self.delta is not None:
+            return self.sample_many_merged(contexts, draws)
+        index = self.numpy_index()
+        length = contexts.shape[1]
+        lo, hi, found = self.find_many(contexts)
+        found &= hi > lo
+        cumulative, totals = index.cumulative[length], index.totals[length]
+        context_total = np.where(found, cumulative[np.maximum(hi - 1, 0)], 0)
+        found &= context_total > 0
+        base = np.where(lo > 0, totals[np.maximum(lo - 1, 0)], 0)
+        successors = np.searchsorted(totals, base + draws * context_total, side='right')
+        words = index.ids[length][np.minimum(successors, len(totals) - 1)].astype(np.int64)
+
+        if not found.all():
+            if length == 0:
+                raise KeyError(())
+            missing = ~found
+            words[missing] = self.sample_many(contexts[missing, 1:], draws[missing])
+        return words
+
+    # sample_many() for a model with a delta, which draws each word the way sample_merged() does, with one binary
+    # search over the successors in each trie for the whole batch
+    def sample_many_merged(self, contexts, draws):
+        length = contexts.shape[1]
+        trie = self.delta.trie
+        own, new = self.successor_ranges(contexts), trie.successor_ranges(contexts)
+        total = own[3] + new[3]
+        found = total > 0
+        targets = draws * total
+        own_words = words_at(self.numpy_index().ids[length], bisect_merged_many(self, trie, length, own, new, targets),
+                             own[2])
+        new_words = words_at(trie.numpy_index().ids[length], bisect_merged_many(trie, self, length, new, own, targets),
+                             new[2])
+        words = np.minimum(own_words, new_words)
+
+        if not found.all():
+            if length == 0:
+                raise KeyError(())
+            missing = ~found
+            words[missing] = self.sample_many(contexts[missing, 1:], draws[missing])
+        return words
+
+    # Returns, for a batch of contexts given as an array with one context per row, the arrays of the node of each
+    # context in level len-1, of the lo and hi bounds of its successors and of their total frequency. Contexts that
+    # were never seen get empty bounds and a total of 0.
+    def successor_ranges(self, contexts):
+        index = self.numpy_index()
+        count, length = contexts.shape
+        if length:
+            node, found = self.locate_many(contexts)
+            starts = index.starts[length - 1]
+            lo, hi = np.where(found, starts[node], 0), np.where(found, starts[node + 1], 0)
+        else:
+            node = lo = np.zeros(count, dtype=np.int64)
+            hi = np.full(count, len(self.ids[0]), dtype=np.int64)
+        return node, lo, hi, range_total(index.totals[length], lo, hi)
+
+    # Releases the memory maps of a loaded model and of its delta
+    def close(self):
+        self.close_delta()
+        if self.buffer is not None:
+            self.ids = self.cumulative = self.starts = self.index = None
+            self.buffer.close()
+            self.buffer = None
+
+    # Releases the memory map of the delta of a loaded model, once nothing else holds its fresh flags
+    def close_delta(self):
+        if self.delta is not None:
+            trie, self.delta = self.delta.trie, None
+            self.delta_distinct = None
+            trie.close()
+
+
+# NumPy views of an NgramModel, built by NgramModel.numpy_index(). For every level of the trie: the sorted search keys,
+# the running totals of node frequencies across the level and the running count of nodes with a frequency above 0,
+# plus the model's own arrays.
+NumpyIndex = namedtuple("NumpyIndex", ["keys", "totals", "distinct", "starts", "ids", "cumulative", "vocab_size"])
+
+# Counts added to a model by update(), kept apart from its trie until NgramModel.compact() merges them into it. trie is
+# an NgramModel of the counts over the extended vocabulary, fresh[d][j] is 1 if node j of level d of trie is not in the
+# model's trie, and base_words is the number of words of the model's own vocabulary.
+Delta = namedtuple("Delta", ["trie", "fresh", "base_words"])
+
+# Result of score(): the number of sentences and of predicted tokens (words and <end> markers), how many of the tokens
+# were not in the vocabulary, the total base-10 log probability of the tokens and the perplexity
+Score = namedtuple("Score", ["sentences", "tokens", "unknown", "log_prob", "perplexity"])
+
+
+# Returns the sum of the values in lo:hi for each pair of bounds, given the running totals of the values
+def range_total(running, lo, hi):
+    before = np.where(lo > 0, running[np.maximum(lo - 1, 0)], 0)
+    return np.where(hi > lo, running[np.maximum(hi - 1, 0)] - before, 0)
+
+
+# Returns the first of the siblings lo:hi, given as bounds, of one trie's level whose running total, plus that of the
+# siblings in other_bounds of the other trie's level up to the same word ID, exceeds target, or hi if none does
+def bisect_merged(ids, cumulative, bounds, other_ids, other_cumulative, other_bounds, target):
+    lo, hi = bounds
+    other_lo, other_hi = other_bounds
+    while lo < hi:
+        mid = (lo + hi) // 2
+        j = bisect_right(other_ids, ids[mid], other_lo, other_hi)
+        if cumulative[mid] + (other_cumulative[j - 1] if j > other_lo else 0) > target:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+# bisect_merged() for a batch of draws from the successors in level d of model and other, given the ranges returned by
+# successor_ranges() for each and the targets. The running total of the siblings in other up to a word ID is found by
+# searching for the key of the word among other's keys. Returns the array of the first siblings found.
+def bisect_merged_many(model, other, d, ranges, other_ranges, targets):
+    index, other_index = model.numpy_index(), other.numpy_index()
+    ids, cumulative = index.ids[d], index.cumulative[d]
+    other_keys, other_cumulative = other_index.keys[d], other_index.cumulative[d]
+    other_node, other_lo, other_hi = other_ranges[:3]
+    lo, hi = ranges[1], ranges[2]
+    active = lo < hi
+    while active.any():
+        mid = np.minimum((lo + hi) // 2, len(ids) - 1)
+        words = ids[mid].astype(np.int64)
+        before = 0
+        if len(other_keys):
+            key = words if d == 0 else other_node * other_index.vocab_size + words
+            j = np.clip(np.searchsorted(other_keys, key, side='right'), other_lo, other_hi)
+            before = np.where(j > other_lo, other_cumulative[np.maximum(j - 1, 0)], 0)
+        above = cumulative[mid] + before > targets
+        hi = np.where(active & above, mid, hi)
+        lo = np.where(active & ~above, mid + 1, lo)
+        active = lo < hi
+    return lo
+
+
+# Finds each of words among the sorted word IDs in lo:hi of ids, for arrays of bounds, by a binary search that only
+# reads the entries it compares. Returns the array of the position of each word, or of a nearby entry for the words
+# that are missing, and a mask of the words found.
+def search_ranges(ids, lo, hi, words):
+    if not len(ids):
+        return np.zeros(len(words), dtype=np.int64), np.zeros(len(words), dtype=bool)
+    end = hi
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        below = ids[np.minimum(mid, len(ids) - 1)] < words
+        lo = np.where(active & below, mid + 1, lo)
+        hi = np.where(active & ~below, mid, hi)
+        active = lo < hi
+    position = np.minimum(lo, len(ids) - 1)
+    return position, (lo < end) & (ids[position] == words)
+
+
+# Returns the word IDs at positions of ids, or the largest int64 for the positions that reached their end
+def words_at(ids, positions, ends):
+    if not len(ids):
+        return np.full(len(positions), np.iinfo(np.int64).max)
+    return np.where(positions < ends, ids[np.minimum(positions, len(ids) - 1)].astype(np.int64), np.iinfo(np.int64).max)
+
+
+# Returns a function that reads the sections of a memory-mapped file one after the other from position, each as an
+# array of count items of the given typecode that starts at a multiple of 8 bytes
+def section_reader(buffer, position):
+    view = memoryview(buffer)
+
+    def section(typecode, count):
+        nonlocal position
+        start = position
+        size = count * array(typecode).itemsize
+        position += align(size)
+        return view[start:start + size].cast(typecode)
+
+    return section
+
+
+# Writes each of sections to file as bytes, padded to a multiple of 8 bytes
+def write_sections(file, sections):
+    for data in sections:
+        data = bytes(data)
+        file.write(data)
+        file.write(bytes(align(len(data)) - len(data)))
+
+
+# Copies a NumPy array into an array of the given typecode
+def to_array(typecode, values):
+    return array(typecode, values.astype(np.dtype(typecode)).tobytes())
+
+
+# Rounds size up to the next multiple of 8
+def align(size):
+    return (size + 7) & ~7
+
+
+# Sentence generator specifically for unigrams, since Markov's Assumption cannot be applied.
+# Every word, including <end>, is drawn in proportion to its frequency in the text.
+def generate_unigram_sentence(model, vocab, draw=random):
+    words = []
+
+    # Runs until <end> marker is reached
+    word = model.sample((), draw)
+    while word != END_ID:
+        words.append(word)
+        word = model.sample((), draw)
+
+    return ids_to_sentence(vocab, words) + "."
+
+
+# Sentences are generated by calculating the probability of the next word based on the preceding words in accordance to
+# Markov's Assumption. A random number between 0 and 1 is generated, which determines the next word in the sentence.
+# This process continues until an <end> marker is reached.
+def generate_sentence(n, model, vocab, draw=random):
+    words = continue_sentence(n, model, (START_ID,) * (n - 1), draw)
+    return ids_to_sentence(vocab, words)
+
+
+# Generates the word IDs that follow the word IDs in context, until <end> is drawn or max_words words have been
+# generated. Only the last n-1 words of the context are used. Whenever the current context was never seen, the
+# model backs off to the longest suffix of it that was.
+def continue_sentence(n, model, context, draw=random, max_words=None):
+    words = []
+    context = tuple(context[len(context) - n + 1:]) if n > 1 else ()
+
+    # Runs until <end> marker is reached
+    word = model.sample_backoff(context, draw)
+    while word != END_ID:
+        words.append(word)
+        if max_words is not None and len(words) >= max_words:
+            break
+        if n > 1:
+            context = context[1:] + (word,)
+        word = model.sample_backoff(context, draw)
+
+    return words
+
+
+# Splits a user-supplied prompt into tokens the same way sentences of the text files are split
+def tokenize_prompt(prompt):
+    return WORD_TOKEN.findall(prompt.lower())
+
+
+# Generates sentences of order n from a model. Iterating over a generator yields sentences lazily, one at a time, and
+# every sentence it produces is determined by its seed.
+# batch() spreads the work over processes, and generate_vectorized() advances many sentences at once with NumPy. Both
+# derive one seed per group of sentences from the generator's seed, so their output is reproducible too, but it is not
+# the same as that of iterating. n defaults to the highest order in the model, and a ValueError is raised if it is
+# not between 1 and that order.
+class SentenceGenerator:
+    def __init__(self, model, n=None, seed=None):
+        if n is None:
+            n = model.max_order
+        if not 1 <= n <= model.max_order:
+            raise ValueError("n should be between 1 and " + str(model.max_order) + " for this model.")
+        self.model = model
+        self.n = n
+        self.rng = Random(seed)
+
+    def __iter__(self):
+        while True:
+            yield self.sentence()
+
+    def sentence(self):
+        if self.n == 1:
+            return generate_unigram_sentence(self.model, self.model.vocab, self.rng.random)
+        return generate_sentence(self.n, self.model, self.model.vocab, self.rng.random)
+
+    # Returns a list of the next m sentences
+    def generate(self, m):
+        return list(islice(self, m))
+
+    # Returns a sentence that begins with prompt and continues it with at most max_words generated words. The prompt is
+    # treated as the beginning of a sentence, and words it contains that are not in the vocabulary make generation
+    # back off to the context that follows them.
+    def continue_prompt(self, prompt, max_words=MAX_CONTINUATION):
+        tokens = tokenize_prompt(prompt)
+        context = [START_ID] * (self.n - 1) + [self.model.vocab.ids.get(token, UNKNOWN_ID) for token in tokens]
+        words = continue_sentence(self.n, self.model, context, self.rng.random, max_words)
+        return tokens_to_sentence(tokens + self.model.vocab.decode(words))
+
+    # Returns a list of m sentences generated in groups of BATCH_SIZE by a pool of worker processes. Each worker
+    # memory-maps the model file once, so the model must have been loaded from a file to use more than one worker.
+    # The sentences only depend on the seed, not on the number of workers.
+    def batch(self, m, workers=1):
+        sizes = [min(BATCH_SIZE, m - i) for i in range(0, m, BATCH_SIZE)]
+        seeds = [self.rng.getrandbits(64) for size in sizes]
+        if workers > 1 and len(sizes) > 1 and self.model.filename is not None:
+            with ProcessPoolExecutor(min(workers, len(sizes))) as executor:
+                groups = executor.map(generate_batch, repeat(self.model.filename), repeat(self.n), seeds, sizes)
+                return list(chain.from_iterable(groups))
+        return [sentence for seed, size in zip(seeds, sizes)
+                for sentence in SentenceGenerator(self.model, self.n, seed).generate(size)]
+
+    # Returns a list of m sentences, generated chains at a time. At every step, the next word of every unfinished
+    # sentence is drawn by one vectorized lookup and sample instead of one Python call per sentence, and a chain that
+    # reaches <end> starts the next sentence. Words are recorded with the number of their sentence and grouped by
+    # sentence at the end.
+    def generate_vectorized(self, m, chains=VECTOR_CHAINS):
+        draws = np.random.default_rng(self.rng.getrandbits(64))
+        chains = min(chains, m)
+        contexts = np.full((chains, self.n - 1), START_ID, dtype=np.int64)
+        sentence_ids = np.arange(chains)  # number of the sentence each chain is generating
+        started = chains
+        steps, step_sentence_ids = [], []
+
+        while sentence_ids.size:
+            words = self.model.sample_many(contexts, draws.random(sentence_ids.size))
+            steps.append(words)
+            step_sentence_ids.append(sentence_ids)
+            if self.n > 1:
+                contexts[:, :-1] = contexts[:, 1:]
+                contexts[:, -1] = words
+
+            ended = np.flatnonzero(words == END_ID)
+            if ended.size:
+                restarted = ended[:m - started]
+                sentence_ids = sentence_ids.copy()
+                sentence_ids[restarted] = np.arange(started, started + restarted.size)
+                contexts[restarted] = START_ID
+                started += restarted.size
+                finished = ended[restarted.size:]
+                if finished.size:
+                    keep = np.ones(sentence_ids.size, dtype=bool)
+                    keep[finished] = False
+                    sentence_ids, contexts = sentence_ids[keep], contexts[keep]
+
+        order = np.argsort(np.concatenate(step_sentence_ids), kind='stable')
+        words = np.concatenate(steps)[order]
+        ends = np.flatnonzero(words == END_ID)
+        sentences = []
+        for start, end in zip(chain([0], ends[:-1] + 1), ends):
+            sentence = ids_to_sentence(self.model.vocab, words[start:end].tolist())
+            sentences.append(sentence + "." if self.n == 1 else sentence)
+        return sentences
+
+
+# Returns the model loaded from filename in a worker process, loading it on first use
+def worker_model(filename):
+    model = worker_models.get(filename)
+    if model is None:
+        model = worker_models[filename] = NgramModel.load(filename)
+    return model
+
+
+# Generates a group of sentences in a worker process of SentenceGenerator.batch()
+def generate_batch(filename, n, seed, size):
+    return SentenceGenerator(worker_model(filename), n, seed).generate(size)
+
+
+# Generates the sentences of a server request in a worker process. A request with a seed gets the same sentences as
+# the generate command given the same options.
+def generate_request(filename, n, m, seed, prefix, max_words):
+    generator = SentenceGenerator(worker_model(filename), n, seed)
+    if prefix is not None:
+        return [generator.continue_prompt(prefix, max_words) for i in range(m)]
+    return generator.batch(m)
+
+
+# Lets a worker process of the server leave interrupts from the terminal to the server process, which shuts it down
+def ignore_interrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# A long-lived service that generates sentences from a saved model over HTTP, on a localhost TCP port or a Unix
+# socket. The model is memory-mapped once by each process of a pool, which does the sampling so that the event loop
+# only parses requests and writes responses, and many clients can be served at once. Connections are kept alive
+# between requests unless the client asks otherwise. The endpoints are:
+#   GET /generate?m=5&n=3&seed=1&prefix=text&max_words=100  (or POST /generate with the same fields as a JSON object)
+#   GET /stats
+# /generate responds with {"sentences": [...]}, and /stats with the number of requests served and of errors among
+# them, and the mean, median, 95th and 99th percentile and largest latency in milliseconds over the last
+# LATENCY_SAMPLES /generate requests. Requests that fail in a worker get a 500 response with {"error": ...}.
+class GenerationServer:
+    def __init__(self, filename, workers=1):
+        self.filename = filename
+        self.model = NgramModel.load(filename)
+        self.executor = ProcessPoolExecutor(workers, initializer=ignore_interrupts)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self.errors = 0
+
+    # Serves requests until the process is interrupted or terminated
+    async def serve(self, host="127.0.0.1", port=8000, socket_path=None):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+            address = socket_path
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            address = "http://" + host + ":" + str(server.sockets[0].getsockname()[1])
+        print("Serving the model of orders 1 to " + str(self.model.max_order) + " from " + self.filename + " on " +
+              address, flush=True)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+        async with server:
+            await stop.wait()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+    # Answers the requests of one connection
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, separator, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                start = perf_counter()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) == 3:
+                    status, payload = await self.respond(parts[0], parts[1], body)
+                else:
+                    status, payload = 400, {"error": "malformed request line"}
+                keep_alive = (len(parts) == 3 and parts[2] == "HTTP/1.1" and
+                              headers.get("connection", "").lower() != "close")
+
+                content = json.dumps(payload).encode('utf-8')
+                writer.write(("HTTP/1.1 " + str(status) + " " + HTTP_REASONS[status] + "\r\n" +
+                              "Content-Type: application/json\r\n" +
+                              "Content-Length: " + str(len(content)) + "\r\n" +
+                              "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n")
+                             .encode('latin-1') + content)
+                await writer.drain()
+                self.record(perf_counter() - start, status, len(parts) == 3 and urlsplit(parts[1]).path == "/generate")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Returns the status and JSON payload of the response to a request
+    async def respond(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/stats":
+            return 200, self.stats()
+        if url.path != "/generate":
+            return 404, {"error": "unknown path " + url.path}
+        if method == "GET":
+            fields = dict(parse_qsl(url.query))
+        elif method == "POST":
+            try:
+                fields = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "body is not valid JSON"}
+            if not isinstance(fields, dict):
+                return 400, {"error": "body should be a JSON object"}
+        else:
+            return 405, {"error": "use GET or POST"}
+
+        try:
+            m = int(fields.get("m", 1))
+            n = int(fields.get("n", self.model.max_order))
+            seed = None if fields.get("seed") is None else int(fields["seed"])
+            max_words = int(fields.get("max_words", MAX_CONTINUATION))
+        except (TypeError, ValueError):
+            return 400, {"error": "m, n, seed and max_words should be integers"}
+        prefix = fields.get("prefix")
+        if not 1 <= m <= MAX_REQUEST_SENTENCES:
+            return 400, {"error": "m should be between 1 and " + str(MAX_REQUEST_SENTENCES)}
+        if not 1 <= n <= self.model.max_order:
+            return 400, {"error": "n should be between 1 and " + str(self.model.max_order)}
+        if max_words < 1 or (prefix is not None and not isinstance(prefix, str)):
+            return 400, {"error": "prefix should be text and max_words greater than 0"}
+
+        loop = asyncio.get_running_loop()
+        try:
+            sentences = await loop.run_in_executor(self.executor, generate_request, self.filename, n, m, seed, prefix,
+                                                   max_words)
+        except Exception as error:  # raised in a worker, or a pool broken by a worker that died
+            return 500, {"error": type(error).__name__ + ": " + str(error)}
+        return 200, {"sentences": sentences}
+
+    # Records a request and its status, and its latency in seconds if it asked for sentences, so that polling /stats
+    # does not skew the latencies of /generate
+    def record(self, latency, status, generate):
+        self.requests += 1
+        if status != 200:
+            self.errors += 1
+        if generate:
+            self.latencies.append(latency)
+
+    # Returns the request count and latency statistics reported by /stats
+    def stats(self):
+        stats = {"requests": self.requests, "errors": self.errors}
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1000
+            stats.update(mean_ms=round(float(latencies.mean()), 3), max_ms=round(float(latencies.max()), 3))
+            for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+                stats[name] = round(float(np.percentile(latencies, q)), 3)
+        return stats
+
+    def close(self):
+        self.executor.shutdown()
+        self.model.close()
+
+
+# Prints how much smaller pruning made a model and how much it changed the distributions sampled from. For every order
+# of 2 or more, the pruned share of successor frequency is the total variation distance between a context's original
+# and pruned successor distributions, averaged over contexts weighted by frequency. Contexts that lost all of their
+# successors make generation back off to a shorter context.
+def print_prune_report(model, pruned):
+    size, pruned_size = model.num_bytes(), pruned.num_bytes()
+    print("Pruned ngrams seen fewer than " + str(pruned.prune_threshold) + " times: " + str(model.num_nodes()) +
+          " -> " + str(pruned.num_nodes()) + " ngrams, " + format(size / 2 ** 20, '.1f') + " MB -> " +
+          format(pruned_size / 2 ** 20, '.1f') + " MB (" + format(100 * (1 - pruned_size / size), '.1f') +
+          "% smaller)")
+
+    threshold = pruned.prune_threshold
+    for d in range(1, model.max_order):
+        cumulative = model.cumulative[d]
+        bounds = model.starts[d - 1]
+        total = pruned_total = backoff_total = 0
+        for lo, hi in zip(bounds, bounds[1:]):
+            if lo == hi or cumulative[hi - 1] == 0:
+                continue
+            context_total = cumulative[hi - 1]
+            kept = model.kept_frequency(d, lo, hi, threshold)
+            total += context_total
+            pruned_total += context_total - kept
+            if kept == 0:
+                backoff_total += context_total
+        if total:
+            print("Order " + str(d + 1) + ": " + format(100 * pruned_total / total, '.2f') +
+                  "% of successor frequency pruned, " + format(100 * backoff_total / total, '.2f') +
+                  "% of context occurrences back off to a shorter context")
+
+
+# Prints a table of the scores of a model for a list of (order, Score) pairs
+def print_scores(scores):
+    first = scores[0][1]
+    print("Scored " + str(first.tokens) + " tokens in " + str(first.sentences) + " sentences, " + str(first.unknown) +
+          " of them not in the vocabulary")
+    print("order".rjust(5) + "log10 probability".rjust(20) + "perplexity".rjust(14))
+    for n, result in scores:
+        print(str(n).rjust(5) + format(result.log_prob, '.1f').rjust(20) + format(result.perplexity, '.2f').rjust(14))
+
+
+# Prints a list of sentences, numbered
+def print_sentences(sentences):
+    for i, sentence in enumerate(sentences):
+        print(str(i+1) + ".\t" + sentence)
+
+
+# Positive integer type for command line arguments
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("should be greater than 0")
+    return number
+
+
+# Parses and runs the commands that split learning a model and generating sentences from it into separate runs:
+#   ngram.py train [--workers k | --memory mb] N model.bin filename1.txt filename2.txt [...]
+#   ngram.py generate [--order n] [--seed s] [--workers k | --vectorized | --prefix text] model.bin m
+#   ngram.py prune model.bin pruned.bin threshold
+#   ngram.py update [--workers k] model.bin filename1.txt filename2.txt [...]
+#   ngram.py compact model.bin
+#   ngram.py score [--order n] model.bin filename1.txt filename2.txt [...]
+#   ngram.py serve [--train N] [--workers k] [--host host] [--port port | --socket path] model.bin [filename1.txt ...]
+# A model trained with N holds every order up to N and can generate sentences with any n from 1 to N.
+def run_command(args):
+    parser = argparse.ArgumentParser(prog="ngram.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="learn a model from text files and save it")
+    train_parser.add_argument("n", type=positive_int, help="highest number of words in an ngram")
+    train_parser.add_argument("model", help="model file to write")
+    train_parser.add_argument("files", nargs="+", help="plain text files to learn from")
+    train_parser.add_argument("--workers", type=positive_int, default=1,
+                              help="number of processes counting files in parallel")
+    train_parser.add_argument("--memory", type=positive_int, metavar="MB",
+                              help="count in a single process and spill counts to temporary files whenever they take "
+                                   "more than about MB megabytes")
+    train_parser.add_argument("--temp-dir", help="directory for the temporary files written with --memory")
+    train_parser.add_argument("--prune", type=positive_int, metavar="THRESHOLD",
+                              help="leave out ngrams of 2 or more words seen fewer than THRESHOLD times")
+
+    generate_parser = commands.add_parser("generate", help="generate sentences from a saved model")
+    generate_parser.add_argument("model", help="model file written by the train command")
+    generate_parser.add_argument("m", type=positive_int, help="number of sentences to generate")
+    generate_parser.add_argument("--order", type=positive_int,
+                                 help="number of words in each ngram (default: the highest order in the model)")
+    generate_parser.add_argument("--seed", type=int, help="seed for the random number generator")
+    generate_parser.add_argument("--workers", type=positive_int, default=1,
+                                 help="number of processes generating sentences in parallel")
+    generate_parser.add_argument("--vectorized", action="store_true",
+                                 help="generate many sentences at once with NumPy")
+    generate_parser.add_argument("--prefix", help="text each generated sentence should begin with")
+    generate_parser.add_argument("--max-words", type=positive_int, default=MAX_CONTINUATION,
+                                 help="largest number of words to add to --prefix (default: %(default)s)")
+
+    prune_parser = commands.add_parser("prune", help="shrink a saved model by leaving out rare ngrams")
+    prune_parser.add_argument("model", help="model file written by the train command")
+    prune_parser.add_argument("pruned", help="pruned model file to write")
+    prune_parser.add_argument("threshold", type=positive_int,
+                              help="leave out ngrams of 2 or more words seen fewer than this many times")
+
+    update_parser = commands.add_parser("update", help="add the text of new files to a saved model")
+    update_parser.add_argument("model", help="model file written by the train command, whose delta file is written")
+    update_parser.add_argument("files", nargs="+", help="plain text files to learn from")
+    update_parser.add_argument("--workers", type=positive_int, default=1,
+                               help="number of processes counting files in parallel")
+
+    compact_parser = commands.add_parser("compact", help="merge the delta written by updates into a saved model")
+    compact_parser.add_argument("model", help="model file written by the train command, which is replaced")
+
+    score_parser = commands.add_parser("score", help="compute the perplexity of a saved model on held-out files")
+    score_parser.add_argument("model", help="model file written by the train command")
+    score_parser.add_argument("files", nargs="+", help="plain text files to score")
+    score_parser.add_argument("--order", type=positive_int,
+                              help="number of words in each ngram (default: every order in the model)")
+
+    serve_parser = commands.add_parser("serve", help="answer generate requests over HTTP until interrupted")
+    serve_parser.add_argument("model", help="model file written by the train command, or to write with --train")
+    serve_parser.add_argument("files", nargs="*", help="plain text files to learn the model from with --train")
+    serve_parser.add_argument("--train", type=positive_int, metavar="N",
+                              help="learn a model of orders 1 to N from the files and save it before serving")
+    serve_parser.add_argument("--workers", type=positive_int, default=os.cpu_count() or 1,
+                              help="number of processes generating sentences (default: number of CPUs)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    serve_parser.add_argument("--port", type=int, default=8000, help="TCP port to listen on (default: %(default)s)")
+    serve_parser.add_argument("--socket", help="path of a Unix socket to listen on instead of a TCP port")
+
+    options = parser.parse_args(args)
+
+    if options.command == "train":
+        if options.memory:
+            model = train_external(options.files, options.n, options.memory << 20, options.temp_dir)
+        else:
+            model = train_model(options.files, options.n, options.workers)
+        if options.prune:
+            pruned = model.prune(options.prune)
+            print_prune_report(model, pruned)
+            model = pruned
+        model.save(options.model)
+        print("Saved model of orders 1 to " + str(options.n) + " with " + str(model.num_nodes()) + " ngrams and " +
+              str(len(model.vocab)) + " words to " + options.model)
+    elif options.command == "generate":
+        model = NgramModel.load(options.model)
+        n = options.order or model.max_order
+        if n > model.max_order:
+            parser.error("--order should be at most " + str(model.max_order) + " for this model.")
+        generator = SentenceGenerator(model, n, options.seed)
+        if options.prefix is not None:
+            if options.vectorized or options.workers > 1:
+                parser.error("--prefix cannot be combined with --vectorized or --workers.")
+            print_sentences([generator.continue_prompt(options.prefix, options.max_words) for i in range(options.m)])
+        elif options.vectorized:
+            print_sentences(generator.generate_vectorized(options.m))
+        else:
+            print_sentences(generator.batch(options.m, options.workers))
+        model.close()
+    elif options.command == "prune":
+        model = NgramModel.load(options.model)
+        full = model.compact()
+        pruned = full.prune(options.threshold)
+        print_prune_report(full, pruned)
+        pruned.save(options.pruned)
+        model.close()
+    elif options.command == "update":
+        model = NgramModel.load(options.model)
+        try:
+            update(model, options.files, options.workers)
+        except ValueError as error:
+            parser.error(str(error))
+        # Write the new delta next to the old one and swap it in, so readers never see a partial file
+        delta_filename = options.model + DELTA_SUFFIX
+        model.save_delta(delta_filename + ".tmp")
+        os.replace(delta_filename + ".tmp", delta_filename)
+        print("Updated model of orders 1 to " + str(model.max_order) + " now has " + str(model.num_nodes()) +
+              " ngrams and " + str(len(model.vocab)) + " words, " + str(model.delta.trie.num_nodes()) +
+              " ngrams of the updates in " + delta_filename)
+        model.close()
+    elif options.command == "compact":
+        model = NgramModel.load(options.model)
+        if model.delta is None:
+            print(options.model + " has no updates to merge")
+        else:
+            # The model without its delta stays readable until the compacted model replaces it
+            model.compact().save(options.model + ".tmp")
+            os.remove(options.model + DELTA_SUFFIX)
+            os.replace(options.model + ".tmp", options.model)
+            print("Compacted model of orders 1 to " + str(model.max_order) + " with " + str(model.num_nodes()) +
+                  " ngrams and " + str(len(model.vocab)) + " words to " + options.model)
+        model.close()
+    elif options.command == "serve":
+        if options.train:
+            if not options.files:
+                parser.error("--train needs the files to learn from.")
+            train_model(options.files, options.train).save(options.model)
+        elif options.files:
+            parser.error("files are only used with --train.")
+        server = GenerationServer(options.model, options.workers)
+        try:
+            asyncio.run(server.serve(options.host, options.port, options.socket))
+        finally:
+            print("Served " + json.dumps(server.stats()))
+            server.close()
+    elif options.command == "score":
+        model = NgramModel.load(options.model)
+        if options.order and options.order > model.max_order:
+            parser.error("--order should be at most " + str(model.max_order) + " for this model.")
+        orders = [options.order] if options.order else range(1, model.max_order + 1)
+        print_scores([(n, score(model, options.files, n)) for n in orders])
+        model.close()
+
+
+def main():
+    if len(argv) > 1 and argv[1] in ("train", "generate", "prune", "update", "compact", "score", "serve"):
+        run_command(argv[1:])
+        return
+
+    print_project_description()
+
+    # receive n, m, and the ngram model from import_data()
+    n, m, model = import_data()
+    print_sentences(SentenceGenerator(model, n).generate(m))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Programming Assignment 3 - POS Tagging - benchmarks
+
+benchmark.py measures the speed of tagger.py. To run it, type the following into the command line:
+
+benchmark.py latency [--repeat r] [--threads k ...] [pos-train.txt pos-test.txt]
+benchmark.py trigram [--beams b ...] [--repeat r] [pos-train.txt pos-test.txt pos-test-key.txt]
+benchmark.py report [--scales k ...] [--output results.json] [pos-train.txt pos-test.txt pos-test-key.txt]
+
+The latency benchmark measures how fast the Tagger object of tagger.py tags sentences for a program that uses it as a
+module. The test file (pos-test.txt next to tagger.py by default) is split into sentences, and both the Viterbi and
+the greedy tagger tag them:
+
+tag()          one sentence per call. The time of every call is recorded, and the mean, median, 95th and 99th
+               percentiles and maximum are reported in microseconds.
+tag_many()     all the sentences in a single call
+threads        one sentence per call of tag(), from k threads sharing a single Tagger at once (1, 2 and 4 by default)
+
+Every measurement is repeated r times (3 by default). Latencies are taken from all the runs, and throughputs from the
+fastest one. The tags found by tag_many() and by the threads are checked to be the same as those found by tag().
+
+Sample run:
+
+%python benchmark.py latency
+2378 sentences, 56824 tokens
+
+tagger   calls                  mean      p50      p95      p99      max   sentences/s     tokens/s
+viterbi  tag()                   109       93      223      333     8620         10804       258173
+viterbi  tag_many()                                                              19548       467119
+viterbi  1 thread                                                                 7035       168106
+viterbi  2 threads                                                                6791       162276
+viterbi  4 threads                                                                6559       156730
+greedy   tag()                    28       21       52       78    18220         43952      1050253
+greedy   tag_many()                                                              38530       920693
+greedy   1 thread                                                                19447       464709
+greedy   2 threads                                                               23702       566371
+greedy   4 threads                                                               19570       467630
+
+Tagging is bound by the Python interpreter, so threads share a single core and only help programs that wait on
+something else between calls.
+
+The trigram benchmark compares the accuracy and speed of the trigram tagger at several beam widths (1, 2, 4, 8 and 16
+by default, and 0, which keeps every pair of tags) with those of the bigram Viterbi and greedy taggers. Every tagger
+tags the whole test file, and its tags are compared with the key the way scorer.py does. Every run is repeated r
+times (3 by default) and the fastest is reported.
+
+Sample run:
+
+%python benchmark.py trigram
+
+tagger                 accuracy     seconds     tokens/s
+greedy                   84.46%       0.083       684804
+viterbi                  93.84%       0.094       604228
+trigram, beam 1          93.19%       0.126       449521
+trigram, beam 2          94.23%       0.163       349169
+trigram, beam 4          94.22%       0.213       266236
+trigram, beam 8          94.22%       0.271       209756
+trigram, beam 16         94.22%       0.342       166255
+trigram, all pairs       94.22%       0.466       122022
+
+The report benchmark measures tagger.py end to end and saves the results as JSON, together with the commit they were
+measured at. Training is measured first: reading the training file, counting its frequency tables and compiling them
+(training tokens per second), then saving the compiled model and loading it again as the model cache does (megabytes
+per second). Then every tagging method (greedy, viterbi and trigram) tags the test file, both whole and streamed with
+--stream, and so does every test file replicated k times (1, 10 and 40 times by default) together with its key. For
+each run, the time taken to read, tag and write out the test file, the throughput in test tokens per second, the peak
+resident memory and the accuracy against the key are reported. Each run is made by a process started for it alone, so
+its peak memory is its own.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+
+import numpy as np
+
+from tagger import (MODEL_CACHE_DIR, Tagger, ends_sentence, import_data, load_model, pos_tagger, read_words,
+                    save_model, stream_tagger, train_model, trigram_tagger, viterbi_tagger, write_to_file)
+
+# Timing and memory measurements are shared with the other benchmarks, in benchmarking.py one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from benchmarking import best_time, git_commit, measure, non_negative_int, positive_int  # noqa: E402
+
+# Training, test and key files used when none are given
+DEFAULT_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                 for name in ("pos-train.txt", "pos-test.txt", "pos-test-key.txt")]
+
+# Beam widths of the trigram tagger compared by default
+DEFAULT_BEAMS = [1, 2, 4, 8, 16, 0]
+
+# Numbers of copies of the test file tagged by the report benchmark by default
+DEFAULT_SCALES = [1, 10, 40]
+
+# Tagging methods of the report benchmark, and the functions that tag a list of words with them
+METHODS = {"greedy": pos_tagger, "viterbi": viterbi_tagger, "trigram": trigram_tagger}
+
+
+# Returns the sentences of a test file, each a list of words, split where tagger.py splits them
+def read_sentences(filename, model):
+    sentences = []
+    sentence = []
+    for words in read_words(filename):
+        for word in words:
+            sentence.append(word.replace("<FWD_SLASH>", "\\/"))
+            if ends_sentence(model, word):
+                sentences.append(sentence)
+                sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+# Prints a row of the latency results table. latencies are in seconds, or None for rows that only have a throughput.
+def print_row(name, calls, latencies, seconds, sentences, tokens):
+    row = name.ljust(9) + calls.ljust(18)
+    if latencies is None:
+        row += " " * 45
+    else:
+        microseconds = np.array(latencies) * 1e6
+        for value in [microseconds.mean()] + list(np.percentile(microseconds, [50, 95, 99])) + [microseconds.max()]:
+            row += str(round(value)).rjust(9)
+    print(row + str(round(sentences / seconds)).rjust(14) + str(round(tokens / seconds)).rjust(13))
+
+
+def benchmark_latency(training_file, test_file, repeat, threads):
+    model = train_model(training_file, MODEL_CACHE_DIR)
+    sentences = read_sentences(test_file, model)
+    tokens = sum(len(sentence) for sentence in sentences)
+    print(str(len(sentences)) + " sentences, " + str(tokens) + " tokens\n")
+    print("tagger".ljust(9) + "calls".ljust(18) + "mean".rjust(9) + "p50".rjust(9) + "p95".rjust(9) +
+          "p99".rjust(9) + "max".rjust(9) + "sentences/s".rjust(14) + "tokens/s".rjust(13))
+
+    for name, greedy in (("viterbi", False), ("greedy", True)):
+        tagger = Tagger(model, greedy)
+
+        # Tags every sentence with its own call, timing each call
+        def tag_one_by_one():
+            tagged, latencies = [], []
+            for sentence in sentences:
+                start = perf_counter()
+                tagged.append(tagger.tag(sentence))
+                latencies.append(perf_counter() - start)
+            return tagged, latencies
+
+        latencies = []
+        seconds = None
+        for i in range(repeat):
+            start = perf_counter()
+            expected, run_latencies = tag_one_by_one()
+            elapsed = perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+            latencies.extend(run_latencies)
+        print_row(name, "tag()", latencies, seconds, len(sentences), tokens)
+
+        seconds, tagged = best_time(lambda: tagger.tag_many(sentences), repeat)
+        if tagged != expected:
+            raise SystemExit("tag_many() found different tags than tag().")
+        print_row(name, "tag_many()", None, seconds, len(sentences), tokens)
+
+        for k in threads:
+            with ThreadPoolExecutor(k) as executor:
+                seconds, tagged = best_time(lambda: list(executor.map(tagger.tag, sentences)), repeat)
+            if tagged != expected:
+                raise SystemExit(str(k) + " threads found different tags than tag().")
+            print_row(name, str(k) + (" thread" if k == 1 else " threads"), None, seconds, len(sentences), tokens)
+
+
+# Returns the tags of a file of tagged words, as scorer.py reads them
+def read_tags(filename):
+    return [word_tag_pair.split('/')[1].split('|')[0] for word_tag_pair in import_data(filename)]
+
+
+def benchmark_trigram(training_file, test_file, key_file, beams, repeat):
+    model = train_model(training_file, MODEL_CACHE_DIR)
+    test_data = import_data(test_file)
+    key = read_tags(key_file)
+    print("tagger".ljust(20) + "accuracy".rjust(11) + "seconds".rjust(12) + "tokens/s".rjust(13))
+
+    taggers = [("greedy", lambda: pos_tagger(test_data, model)), ("viterbi", lambda: viterbi_tagger(test_data, model))]
+    for beam in beams:
+        name = "trigram, " + ("beam " + str(beam) if beam else "all pairs")
+        taggers.append((name, lambda beam=beam: trigram_tagger(test_data, model, beam)))
+
+    for name, tag in taggers:
+        seconds, tagged_words = best_time(tag, repeat)
+        tags = [tagged_word.rsplit('/', 1)[1] for tagged_word in tagged_words]
+        accuracy = 100 * sum(tag == actual for tag, actual in zip(tags, key)) / len(key)
+        print(name.ljust(20) + ("%.2f%%" % accuracy).rjust(11) + ("%.3f" % seconds).rjust(12) +
+              str(round(len(test_data) / seconds)).rjust(13))
+
+
+# Trains on the training file and saves the compiled model to model_file, in a process of its own, and returns a
+# result for training and for loading the model back
+def run_training(training_file, model_file):
+    tokens = len(import_data(training_file))
+    model, seconds, peak = measure(lambda: train_model(training_file, None))
+    results = [{"phase": "train", "tokens": tokens, "seconds": round(seconds, 4), "peak_rss_mb": round(peak, 1),
+                "per_second": round(tokens / seconds, 1), "unit": "tokens"}]
+    save_model(model, model_file)
+    size = os.path.getsize(model_file) / 2 ** 20
+    model, seconds, peak = measure(lambda: load_model(model_file))
+    results.append({"phase": "load", "megabytes": round(size, 3), "seconds": round(seconds, 4),
+                    "peak_rss_mb": round(peak, 1), "per_second": round(size / seconds, 1), "unit": "MB"})
+    return results
+
+
+# Tags a test file with the model in model_file, in a process of its own, and returns the result: the time taken to
+# read, tag and write out the test file, the peak memory meanwhile, and the accuracy of the tags against the key
+def run_tagging(model_file, test_file, key_file, method, stream, output_file):
+    model = load_model(model_file)
+
+    # Reads, tags and writes out the test file as tagger.py does
+    def tag():
+        if stream:
+            stream_tagger(test_file, model, output_file, method)
+        else:
+            write_to_file(METHODS[method](import_data(test_file), model), output_file)
+
+    _, seconds, peak = measure(tag)
+    tags = read_tags(output_file)
+    key = read_tags(key_file)
+    accuracy = 100 * sum(tag == actual for tag, actual in zip(tags, key)) / len(key)
+    return {"method": method, "stream": stream, "tokens": len(key), "seconds": round(seconds, 4),
+            "peak_rss_mb": round(peak, 1), "tokens_per_second": round(len(key) / seconds, 1),
+            "accuracy": round(accuracy, 4)}
+
+
+# Writes copies copies of a file, one after the other, to filename
+def write_copies(source, filename, copies):
+    with open(source) as file:
+        text = file.read()
+    with open(filename, 'w') as file:
+        for i in range(copies):
+            file.write(text)
+            if not text.endswith("\n"):
+                file.write("\n")
+
+
+def benchmark_report(training_file, test_file, key_file, scales, output):
+    report = {"commit": git_commit(), "date": datetime.datetime.now().isoformat(timespec='seconds'),
+              "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+              "training": [], "results": []}
+
+    # Each run gets a process of its own, which starts with nothing left over from the runs before it
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="tagger-benchmark-") as temp_dir:
+        model_file = os.path.join(temp_dir, "model.bin")
+        with context.Pool(1) as pool:
+            report["training"] = pool.apply(run_training, (training_file, model_file))
+        print("phase".ljust(8) + "seconds".rjust(10) + "peak MB".rjust(10) + "throughput".rjust(14))
+        for result in report["training"]:
+            print(result["phase"].ljust(8) + ("%.3f" % result["seconds"]).rjust(10) +
+                  ("%.1f" % result["peak_rss_mb"]).rjust(10) + ("%.0f" % result["per_second"]).rjust(14) + " " +
+                  result["unit"] + "/s")
+
+        print()
+        print("copies".ljust(8) + "tagger".ljust(20) + "seconds".rjust(10) + "peak MB".rjust(10) +
+              "tokens/s".rjust(12) + "accuracy".rjust(11))
+        for copies in scales:
+            if copies == 1:
+                test_copies, key_copies = test_file, key_file
+            else:
+                test_copies = os.path.join(temp_dir, "test-" + str(copies) + ".txt")
+                key_copies = os.path.join(temp_dir, "key-" + str(copies) + ".txt")
+                write_copies(test_file, test_copies, copies)
+                write_copies(key_file, key_copies, copies)
+            for stream in (False, True):
+                for method in METHODS:
+                    output_file = os.path.join(temp_dir, "output.txt")
+                    with context.Pool(1) as pool:
+                        result = pool.apply(run_tagging, (model_file, test_copies, key_copies, method, stream,
+                                                          output_file))
+                    result["copies"] = copies
+                    report["results"].append(result)
+                    print(str(copies).ljust(8) + (method + (", streamed" if stream else "")).ljust(20) +
+                          ("%.3f" % result["seconds"]).rjust(10) + ("%.1f" % result["peak_rss_mb"]).rjust(10) +
+                          ("%.0f" % result["tokens_per_second"]).rjust(12) + ("%.2f%%" % result["accuracy"]).rjust(11))
+            if copies != 1:
+                os.remove(test_copies)
+                os.remove(key_copies)
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=1)
+    print("Saved results to " + output)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    latency_parser = benchmarks.add_parser("latency", help="measure how fast sentences are tagged in-process")
+    latency_parser.add_argument("--repeat", type=positive_int, default=3,
+                                help="number of times each measurement is repeated (default: 3)")
+    latency_parser.add_argument("--threads", type=positive_int, nargs="+", default=[1, 2, 4], metavar="K",
+                                help="numbers of threads tagging at once (default: 1 2 4)")
+    latency_parser.add_argument("files", nargs="*", default=DEFAULT_FILES[:2], metavar="FILE",
+                                help="training file and test file (default: pos-train.txt and pos-test.txt)")
+
+    trigram_parser = benchmarks.add_parser("trigram", help="compare the trigram tagger at several beam widths")
+    trigram_parser.add_argument("--beams", type=non_negative_int, nargs="+", default=DEFAULT_BEAMS, metavar="B",
+                                help="beam widths to compare, 0 for no beam (default: 1 2 4 8 16 0)")
+    trigram_parser.add_argument("--repeat", type=positive_int, default=3,
+                                help="number of times each tagger is run (default: 3)")
+    trigram_parser.add_argument("files", nargs="*", default=DEFAULT_FILES, metavar="FILE",
+                                help="training, test and key files (default: pos-train.txt, pos-test.txt and "
+                                     "pos-test-key.txt)")
+
+    report_parser = benchmarks.add_parser("report", help="measure training, tagging speed, memory and accuracy")
+    report_parser.add_argument("--scales", type=positive_int, nargs="+", default=DEFAULT_SCALES, metavar="K",
+                               help="numbers of copies of the test file to tag (default: 1 10 40)")
+    report_parser.add_argument("--output", default="tagger-results.json",
+                               help="JSON file to save the results to (default: %(default)s)")
+    report_parser.add_argument("files", nargs="*", default=DEFAULT_FILES, metavar="FILE",
+                               help="training, test and key files (default: pos-train.txt, pos-test.txt and "
+                                    "pos-test-key.txt)")
+
+    options = parser.parse_args()
+
+    if options.benchmark == "latency":
+        if len(options.files) != 2:
+            parser.error("give both a training file and a test file")
+        benchmark_latency(options.files[0], options.files[1], options.repeat, options.threads)
+    elif options.benchmark == "trigram":
+        if len(options.files) != 3:
+            parser.error("give a training file, a test file and a key file")
+        benchmark_trigram(options.files[0], options.files[1], options.files[2], options.beams, options.repeat)
+    elif options.benchmark == "report":
+        if len(options.files) != 3:
+            parser.error("give a training file, a test file and a key file")
+        benchmark_report(options.files[0], options.files[1], options.files[2], options.scales, options.output)
+
+
+if __name__ == "__main__":
+    main()
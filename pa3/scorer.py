@@ -12,8 +12,13 @@ In addition, it also generates a confusion matrix.
 """
 
 from sys import argv
-import pandas as pd
+import os
 import re
+import sys
+
+# Scoring is shared with the scorers of the other programming assignments, in scoring.py one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import scoring  # noqa: E402
 
 
 # Reads text files and returns them as a string list with brackets removed
@@ -24,48 +29,32 @@ def import_data(filename):
     output = re.sub(r"[\[\]]", "", output)
     # Replace forward slashes in text file that aren't delineators with <FWD_SLASH> tag.
     # This will be undone after words and tags are separated in create_freq_tables
-    output = output.replace("\/", "<FWD_SLASH>")
+    output = output.replace("\\/", "<FWD_SLASH>")
     return output.split()
 
 
 def create_array(pair_list):
     output_array = []
     for word_tag_pair in pair_list:
-        current_pair = re.split('/', word_tag_pair)
+        current_pair = word_tag_pair.split('/')
         output_array.append(current_pair[1].split('|')[0])
     return output_array
 
 
 # Calculate score
 def scorer(prediction, key):
-    match = 0
-    total = len(key)  # Denominator is the number of tagged pairs
-
-    # Iterate through key array, if there's a match with prediction array, then iterate match
-    #
-    for i in range(len(key)):
-        if prediction[i] == key[i]:
-            match += 1
-
-    return match / total
+    return scoring.score(prediction, key)
 
 
+# Returns the confusion matrix as text, laid out as pandas prints a crosstab
 def create_confusion_matrix(prediction, key):
-    y_actual = pd.Series(key, name="Actual Tag")
-    x_prediction = pd.Series(prediction, name="Predicted Tag")
-
-    # These four settings make Panda display the whole matrix
-    pd.set_option('display.max_rows', None)
-    pd.set_option('display.max_columns', None)
-    pd.set_option('display.width', None)
-    pd.set_option('display.max_colwidth', None)
-
-    return pd.crosstab(y_actual, x_prediction)
+    matrix = scoring.confusion_matrix(prediction, key, "Actual Tag", "Predicted Tag")
+    return scoring.format_confusion_matrix(matrix)
 
 
 def write_to_file(score, matrix, filename):
     with open(filename, "w") as output_file:
-        output_file.write("The accuracy of tagger.py is: " + str.format('{0:.2f}', score) + "%.\n\n" + matrix.to_string())
+        output_file.write("The accuracy of tagger.py is: " + str.format('{0:.2f}', score) + "%.\n\n" + matrix)
 
     return None
 
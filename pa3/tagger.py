@@ -1,289 +1,1013 @@
-"""
-Programming Assignment 3 - POS Tagging - Tagger
-
-Roy Chung
-20210314
-CMSC 416-001
-
-tagger.py is a program that takes as input a training file containing part of speech tagged text, and  a file
-containing text to be part of speech tagged. This program uses the training data to determine the most likely
-tag for each word in the text to be tagged.
-
-Each word in the training data is assigned a POS tag that maximizes P(tag|word). This is done by looking at the most
-likely tag for each word in the training data, as well as the mostly likely tag that follows the previous tag.
-Words in the test data not found in the training data is assumed to be a singular/mass noun and given an "NN" tag.
-
-The following are the formulas used to calculate the probability that a given word has a particular tag:
-P(tag|word) = P(word|tag) * P(tag|tag-1)
-P(word_i|tag_i) = freq(tag_i, word_i)/freq(tag_i)
-P(tag_i|tag_i-1) = freq(tag_i-1|tag_i)/freq(tag_i)
-
-The program outputs the tagged test file as a plain text file whose filename is determined by command line arguments.
-
-Results can be scored by comparing the output file to the key using the accompanying scorer.py.
-
-To run this program, place the training and test files into the same directory as pagger.py,
-and enter the following into the command line:
-
-python tagger.py pos-train.txt pos-test.txt > pos-test-with-tags.txt
-Replace "pos-train.txt" with the name of the training file, "pos-test.txt" with the name of the test file,
-and "pos-test-with-tags.txt" with your desired output file name. If no arguments are entered after pos-train.txt and
-pos-test.txt, then the name of the output file will default to "pos-test-with-tags.txt."
-"""
-
-from sys import argv
-import re
-
-
-# Reads text files and returns them as a string list with brackets removed
-def import_data(filename):
-    output = ""
-    with open(filename, 'r') as data:
-        output += data.read()
-    output = re.sub(r"[\[\]]", "", output)
-    # Replace forward slashes in text file that aren't delineators with <FWD_SLASH> tag.
-    # This will be undone after words and tags are separated in create_freq_tables
-    output = output.replace("\/", "<FWD_SLASH>")
-    return output.split()
-
-
-# Create Word/Tag and Tag/Tag-1 frequency tables from training list created from training file
-def create_freq_tables(training_list):
-    word_tag_freq = {}
-    tag_tag1_freq = {}
-    tag_freq = {}
-    tag1 = None
-
-    # iterate through all word/tag pairs in training list
-    for word_tag_pair in training_list:
-        # split current pair into word and tag
-        current_pair = re.split('/', word_tag_pair)
-        word = current_pair[0].replace("<FWD_SLASH>", "\/")  # replace <FWD_SLASH> tag generated in import_data with \/
-        tag = current_pair[1].split('|')[0]  # If a tag has a | symbol (e.g. NN|JJ), only use first part
-
-        if tag not in tag_freq:
-            tag_freq[tag] = 1
-        else:
-            tag_freq[tag] += 1
-
-        # populate word + tag frequency table with frequency of each word+tag combination
-        if word in word_tag_freq:
-            if tag in word_tag_freq[word]:
-                word_tag_freq[word][tag] += 1
-            else:
-                word_tag_freq[word][tag] = 1
-        else:
-            word_tag_freq[word] = {}
-            word_tag_freq[word][tag] = 1
-
-        # populate tag + tag-1 frequency table with frequency of each word+tag combination
-        if tag1 in tag_tag1_freq:
-            if tag in tag_tag1_freq[tag1]:  # if tag-1|tag is in array, iterate
-                tag_tag1_freq[tag1][tag] += 1
-            else:
-                tag_tag1_freq[tag1][tag] = 1  # if tag1 is in array but tag is not, make tag-1|tag equal to 1
-        elif tag1 is not None:  # if neither is in array, create element for tag-1|tag and make it equal to 1
-            tag_tag1_freq[tag1] = {}
-            tag_tag1_freq[tag1][tag] = 1
-        #  If tag1 is None, skip this step for current loop
-
-        # set tag-1 equal to current tag before repeating loop
-        tag1 = tag
-
-    return word_tag_freq, tag_tag1_freq, tag_freq
-
-
-# POS-tags test data
-def pos_tagger(test_data, word_tag_freq, tag_tag1_freq, tag_freq_table):
-    tagged_words = []
-    tag1 = None
-
-    for word in test_data:
-        max_prob = 0  # used to store maximum P(tag|word)
-
-        # replace <FWD_SLASH> tag generated in import_data with \/
-        word = word.replace("<FWD_SLASH>", "\/")
-
-        # assume any word found in test data that's not in training data is a singular/mass noun (NN)
-        if word not in word_tag_freq:
-            tagged_words.append(word + '/' + 'NN')
-            tag1 = 'NN'
-            continue
-
-        # First word case (no tag-1)
-        if tag1 is None:
-            # find tag that maximizes P(word|tag)
-            for tag, tag_freq in word_tag_freq[word].items():
-                # P(word|tag) = freq(tag, word) / freq(tag)
-                current_prob = word_tag_freq[word][tag] / tag_freq_table[tag]
-                if current_prob > max_prob:  # if current_prob > stored max_prob, update max_prob and max_tag
-                    max_prob = current_prob
-                    max_tag = tag
-
-            # --------- Begin custom rules: ---------
-            # If a word is uppercase and the the tag of the previous word is not a sentence-final punctuation,
-            # assume proper noun
-            if word.isupper():
-                if tag1 != ".":
-                    max_tag == "NNP"
-                    tag == "NNP"
-                    if word.endswith('s'):
-                        max_tag == "NNPS"
-                        tag == "NNPS"
-
-            if word == "''":
-                max_tag = "''"
-                tag = "''"
-
-            if word == "#":
-                max_tag = "#"
-                tag = "#"
-
-            if word == "$":
-                max_tag = "$"
-                tag = "$"
-
-            if word == ",":
-                max_tag = ","
-                tag = ","
-
-            if word == ":":
-                max_tag = ":"
-                tag = ":"
-
-            # if word is a !, ., or ?, it is a sentence-final punctuation (".")
-            if re.match(r"^[!.?]+$", word):
-                max_tag = "."
-                tag = "."
-
-            # if a word begins with a number and ends with an 's,' assume plural proper noun (e.g. Boeing *757s*)
-            if word[0].isnumeric():
-                if word.endswith('s'):
-                    max_tag = "NNPS"
-                    tag = "NNPS"
-            # ---------- End custom rules: ----------
-
-            tagged_words.append(word + '/' + max_tag)
-            tag1 = tag
-            continue
-
-        # All other cases
-        for tag, tag_freq in word_tag_freq[word].items():
-            if tag not in tag_tag1_freq[tag1]:
-                continue
-
-            # P(tag|word) * P(tag|tag-1) = (freq(tag, word) / freq(tag)) * (freq(tag-1, tag) / freq(tag-1))
-            current_prob = (word_tag_freq[word][tag] / tag_freq_table[tag]) * \
-                           (tag_tag1_freq[tag1][tag] / tag_freq_table[tag1])
-
-            # if current_prob > stored max_prob, update max_prob and max_tag
-            if current_prob > max_prob:
-                max_prob = current_prob
-                max_tag = tag
-
-        # --------- Begin custom rules: ---------
-        # If a word is uppercase and the the tag of the previous word is not a sentence-final punctuation,
-        # assume proper noun
-        if word.isupper():
-            if tag1 != ".":
-                max_tag == "NNP"
-                tag == "NNP"
-                if word.endswith('s'):
-                    max_tag == "NNPS"
-                    tag == "NNPS"
-
-        if word == "''":
-            max_tag = "''"
-            tag = "''"
-
-        if word == "#":
-            max_tag = "#"
-            tag = "#"
-
-        if word == "$":
-            max_tag = "$"
-            tag = "$"
-
-        if word == ",":
-            max_tag = ","
-            tag = ","
-
-        if word == ":":
-            max_tag = ":"
-            tag = ":"
-
-        if re.match(r"^[!.?]+$", word):
-            max_tag = "."
-            tag = "."
-
-        #if a word begins with a number and ends with an 's,' assume plural proper noun (e.g. Boeing *757s*)
-        if word[0].isnumeric():
-            if word.endswith('s'):
-                max_tag = "NNPS"
-                tag = "NNPS"
-        # ---------- End custom rules: ----------
-
-        tagged_words.append(word + '/' + max_tag)
-        tag1 = tag
-
-    return tagged_words
-
-
-# Writes list to plain text file
-def write_to_file(tagged_words, filename):
-    with open(filename, "w") as output_file:
-        output_file.write("\n".join(tagged_words))
-    return None
-
-
-# Prints error message for improper command line arguments
-def print_error():
-    print('Invalid arguments. Please enter properly formatted arguments:')
-    print('python tagger.py pos-train.txt pos-test.txt > pos-test-with-tags.txt')
-    print('\nReplace "pos-train.txt" with the name of the training file,')
-    print('"pos-test.txt" with the name of the test file,')
-    print('and "pos-test-with-tags.txt" with your desired output file name.')
-    print('Ensure trainer and test files are placed in the same directory as tagger.py.')
-    print('If no arguments are entered after pos-train.txt and pos-test.txt,')
-    print('then the name of the output file will default to "pos-test-with-tags.txt."')
-    return None
-
-
-def main():
-    # Print error and exit if training and test files are not specified in the command line
-    if len(argv) < 3:
-        print_error()
-        exit()
-
-    # Process training data and store in list
-    training_data = import_data(argv[1])
-    # print(training_data)
-
-    # Process test data and store in list
-    test_data = import_data(argv[2])
-    # print(test_data)
-
-    # Obtain Word/Tag and Tag/Tag-1 frequency tables from training data
-    word_tag_freq, tag_tag1_freq, tag_freq = create_freq_tables(training_data)
-    # print(word_tag_freq)
-    # print(tag_tag1_freq)
-    # print(tag_freq)
-
-    # Obtain POS-tagged word list
-    tagged_words = pos_tagger(test_data, word_tag_freq, tag_tag1_freq, tag_freq)
-    # print(tagged_words)
-
-    # Obtain output filename from command line, or give it default name
-    if len(argv) >= 5 and argv[3] == ">":
-        output_filename = argv[4]
-    else:
-        output_filename = "pos-test-with-tags.txt"
-
-    # Write the POS-tagged list to a plain text file
-    write_to_file(tagged_words, output_filename)
-
-    print('Success! Open "' + output_filename + '" in the current directory to view the POS-tagged test data.')
-
-
-if __name__ == "__main__":
-    main()
+"""
+Programming Assignment 3 - POS Tagging - Tagger
+
+Roy Chung
+20210314
+CMSC 416-001
+
+tagger.py is a program that takes as input a training file containing part of speech tagged text, and  a file
+containing text to be part of speech tagged. This program uses the training data to determine the most likely
+tag for each word in the text to be tagged.
+
+Each word in the training data is assigned a POS tag that maximizes P(tag|word). This is done by looking at the most
+likely tag for each word in the training data, as well as the mostly likely tag that follows the previous tag.
+Words in the test data not found in the training data is assumed to be a singular/mass noun and given an "NN" tag.
+
+The following are the formulas used to calculate the probability that a given word has a particular tag:
+P(tag|word) = P(word|tag) * P(tag|tag-1)
+P(word_i|tag_i) = freq(tag_i, word_i)/freq(tag_i)
+P(tag_i|tag_i-1) = freq(tag_i-1|tag_i)/freq(tag_i)
+
+By default, the tags of a whole sentence are chosen together by the Viterbi algorithm, which finds the sequence of tags
+that maximizes the product of these probabilities over the sentence, rather than the best tag for each word given
+the tag chosen for the word before it. Sentences end at sentence-final punctuation. Transition probabilities are
+smoothed by add-one smoothing, and the tags of words not found in the training data are predicted from the tags of
+words seen only once in the training data that are spelled alike (capitalized, numbers, hyphenated, or ending in
+-ing, -ed, -ly or -s). To tag one word at a time as before, add --greedy to the command line.
+
+With --trigram, the tag of a word depends on the tags of the two words before it rather than one. Trigram, bigram and
+unigram estimates of P(tag|tag-2, tag-1) are interpolated with weights chosen by deleted interpolation. Only the b most
+likely pairs of tags are kept for every word (--beam=b, 4 by default, or 0 to keep them all), which bounds the work
+per word. On pos-test.txt, the trigram tagger is about 0.4 points more accurate than the bigram one, at less than half
+its speed; see benchmark.py.
+
+With --stream, the test file is read line by line and tagged in batches of whole sentences, each written out as soon
+as it is tagged, so that output starts right away and memory use does not grow with the size of the test file. The
+output is the same as without --stream.
+
+With --workers=k, sentences are tagged by k processes in parallel, in batches that are put back together in their
+original order, so that the output is the same as with a single process.
+
+The greedy tagger's choice for a word depends only on the word and the tag before it, so it caches its most recent
+choices. With --cache-stats, the hit rate of the cache is printed after tagging with a single process.
+
+Before tagging, the frequency tables are compiled once into tables of log probabilities indexed by integer tag IDs, so
+that scoring a tag is an addition and a few lookups rather than divisions over dictionaries keyed by strings.
+The compiled tables are saved in ~/.cache/pos-tagger (or $XDG_CACHE_HOME/pos-tagger), named after the SHA-256 hash of
+the training file, and loaded from there the next time the same training file is used, so that training is skipped.
+Add --no-cache to always train from the training file.
+
+Other programs can tag sentences without files by importing the Tagger class, which trains (or loads from the cache)
+once and tags lists of words with tag() and tag_many(); see its comment. benchmark.py measures its latency.
+
+The program outputs the tagged test file as a plain text file whose filename is determined by command line arguments.
+
+Results can be scored by comparing the output file to the key using the accompanying scorer.py.
+
+To run this program, place the training and test files into the same directory as pagger.py,
+and enter the following into the command line:
+
+python tagger.py [--greedy | --trigram [--beam=b]] [--stream] [--workers=k] [--cache-stats] [--no-cache]
+    pos-train.txt pos-test.txt > pos-test-with-tags.txt
+Replace "pos-train.txt" with the name of the training file, "pos-test.txt" with the name of the test file,
+and "pos-test-with-tags.txt" with your desired output file name. If no arguments are entered after pos-train.txt and
+pos-test.txt, then the name of the output file will default to "pos-test-with-tags.txt."
+"""
+
+from sys import argv
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import hashlib
+import os
+import re
+import struct
+import numpy as np
+
+# Words that always end a sentence, and are always tagged "."
+SENTENCE_FINAL = re.compile(r"^[!.?]+$")
+
+# Words the custom rules always give the same tag
+RULE_TAGS = {"''": "''", "#": "#", "$": "$", ",": ",", ":": ":"}
+
+# Endings that unknown words are grouped by to predict their tags
+SUFFIXES = ("ing", "ed", "ly", "s")
+
+# Tags of an unknown word less likely than this fraction of its most likely tag are not considered by the Viterbi
+# algorithm, which keeps the number of paths it compares small
+UNKNOWN_TAG_RATIO = 0.01
+
+# Number of words the streaming mode reads before tagging them up to the end of the last whole sentence, at most. The
+# first sentence is tagged on its own so that output starts right away, and the number doubles from there up to this
+# many words, so that the cost of starting the tagger is shared by many sentences while memory use stays bounded.
+STREAM_BATCH_WORDS = 4096
+
+# Model file header: magic, format version, number of tags, number of words of the training data, number of groups of
+# unknown words, number of emission entries, size in bytes of the newline-separated tags, words and groups
+MODEL_HEADER = struct.Struct("=8sIIQIQQ")
+MODEL_MAGIC = b"POSMODEL"
+MODEL_VERSION = 2
+
+# Directory where compiled models are cached, each named after the hash of its training file
+MODEL_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pos-tagger")
+
+# Number of the most recent decisions of the greedy tagger, one for each pair of previous tag and word, that are kept
+# so that they do not have to be worked out again
+DECISION_CACHE_SIZE = 1 << 16
+
+# Number of words up to which Tagger decodes sentences with the Viterbi algorithm on plain lists rather than on arrays,
+# whose fixed cost is larger than the whole decoding of a few sentences
+LIST_DECODE_WORDS = 256
+
+# Number of pairs of tags the trigram tagger keeps for every word by default. 0 keeps them all.
+TRIGRAM_BEAM = 4
+
+# Tables of log probabilities compiled from the frequency tables by compile_model(). tags lists the tags, so that a tag
+# is referred to by its index in the list. Emissions are stored sparsely, one row per word: the tags row i can have are
+# emission_tags[offsets[i]:offsets[i + 1]], in the order the training data first used them, and emission_probs holds
+# log P(word|tag) for each of them. rows gives the row of every word of the training data. After them come one row for
+# each group of unknown words, given by shape_rows, and one row for each tag that a rule can force, given by rule_rows.
+# transitions[i][j] is the smoothed log P(tag j|tag i), and observed_transitions[i][j] the unsmoothed one, which is
+# -inf for tags never seen one after the other. trigram_transitions[h][i][j] is the interpolated
+# log P(tag j|tag h, tag i) of the trigram tagger.
+Model = namedtuple("Model", ["tags", "tag_ids", "rows", "shape_rows", "rule_rows", "offsets", "emission_tags",
+                             "emission_probs", "transitions", "observed_transitions", "trigram_transitions"])
+
+
+# Reads text files and returns them as a string list with brackets removed
+def import_data(filename):
+    output = ""
+    with open(filename, 'r') as data:
+        output += data.read()
+    output = re.sub(r"[\[\]]", "", output)
+    # Replace forward slashes in text file that aren't delineators with <FWD_SLASH> tag.
+    # This will be undone after words and tags are separated in create_freq_tables
+    output = output.replace("\\/", "<FWD_SLASH>")
+    return output.split()
+
+
+# Reads a text file a block of lines at a time, yielding the words of each block cleaned up the same way as by
+# import_data
+def read_words(filename, block_size=1 << 16):
+    with open(filename, 'r') as data:
+        while True:
+            lines = data.readlines(block_size)
+            if not lines:
+                return
+            block = re.sub(r"[\[\]]", "", "".join(lines)).replace("\\/", "<FWD_SLASH>")
+            yield block.split()
+
+
+# Create Word/Tag and Tag/Tag-1 frequency tables from training list created from training file
+def create_freq_tables(training_list):
+    word_tag_freq = {}
+    tag_tag1_freq = {}
+    tag_freq = {}
+    tag1 = None
+
+    # iterate through all word/tag pairs in training list
+    for word_tag_pair in training_list:
+        # split current pair into word and tag
+        current_pair = re.split('/', word_tag_pair)
+        word = current_pair[0].replace("<FWD_SLASH>", "\\/")  # replace <FWD_SLASH> tag generated in import_data with \/
+        tag = current_pair[1].split('|')[0]  # If a tag has a | symbol (e.g. NN|JJ), only use first part
+
+        if tag not in tag_freq:
+            tag_freq[tag] = 1
+        else:
+            tag_freq[tag] += 1
+
+        # populate word + tag frequency table with frequency of each word+tag combination
+        if word in word_tag_freq:
+            if tag in word_tag_freq[word]:
+                word_tag_freq[word][tag] += 1
+            else:
+                word_tag_freq[word][tag] = 1
+        else:
+            word_tag_freq[word] = {}
+            word_tag_freq[word][tag] = 1
+
+        # populate tag + tag-1 frequency table with frequency of each word+tag combination
+        if tag1 in tag_tag1_freq:
+            if tag in tag_tag1_freq[tag1]:  # if tag-1|tag is in array, iterate
+                tag_tag1_freq[tag1][tag] += 1
+            else:
+                tag_tag1_freq[tag1][tag] = 1  # if tag1 is in array but tag is not, make tag-1|tag equal to 1
+        elif tag1 is not None:  # if neither is in array, create element for tag-1|tag and make it equal to 1
+            tag_tag1_freq[tag1] = {}
+            tag_tag1_freq[tag1][tag] = 1
+        #  If tag1 is None, skip this step for current loop
+
+        # set tag-1 equal to current tag before repeating loop
+        tag1 = tag
+
+    return word_tag_freq, tag_tag1_freq, tag_freq
+
+
+# Create (Tag-2, Tag-1)/Tag frequency table from training list created from training file, which gives how often each
+# tag follows each pair of tags
+def create_trigram_freq_table(training_list):
+    tag_tag2_freq = {}
+    tag2, tag1 = None, None
+    for word_tag_pair in training_list:
+        tag = re.split('/', word_tag_pair)[1].split('|')[0]  # If a tag has a | symbol (e.g. NN|JJ), only use first part
+        if tag2 is not None:
+            successors = tag_tag2_freq.setdefault((tag2, tag1), {})
+            successors[tag] = successors.get(tag, 0) + 1
+        tag2, tag1 = tag1, tag
+    return tag_tag2_freq
+
+
+# Returns the tag the custom rules give word whatever the words around it, or None if no rule applies to it
+def rule_tag(word):
+    if word in RULE_TAGS:
+        return RULE_TAGS[word]
+    # if word is a !, ., or ?, it is a sentence-final punctuation (".")
+    if SENTENCE_FINAL.match(word):
+        return "."
+    # if a word begins with a number and ends with an 's,' assume plural proper noun (e.g. Boeing *757s*)
+    if word[:1].isnumeric() and word.endswith('s'):
+        return "NNPS"
+    return None
+
+
+# Returns the group of words spelled alike that word belongs to, which is used to predict the tags of unknown words, or
+# None for an empty word, which is tagged like unknown words of groups the training data has no words of
+def word_shape(word):
+    if not word:
+        return None
+    if word[0].isdigit():
+        return "number"
+    if "-" in word:
+        return "hyphenated"
+    if word[0].isupper():
+        return "capitalized"
+    for suffix in SUFFIXES:
+        if word.endswith(suffix):
+            return "-" + suffix
+    return "other"
+
+
+# Compiles the frequency tables into the log probability tables the taggers work with, so that tagging only adds and
+# looks up numbers by index
+def compile_model(word_tag_freq, tag_tag1_freq, tag_freq, tag_tag2_freq):
+    tags = sorted(tag_freq)
+    tag_ids = {tag: i for i, tag in enumerate(tags)}
+    num_tags = len(tags)
+    tag_counts = np.array([tag_freq[tag] for tag in tags], dtype=float)
+
+    # Add-one smoothed transition probabilities, so that no sequence of tags is impossible
+    transition_counts = np.zeros((num_tags, num_tags))
+    for tag1, successors in tag_tag1_freq.items():
+        for tag, freq in successors.items():
+            transition_counts[tag_ids[tag1], tag_ids[tag]] = freq
+    transitions = np.log((transition_counts + 1) / (transition_counts.sum(axis=1, keepdims=True) + num_tags))
+    with np.errstate(divide='ignore'):
+        observed_transitions = np.log(transition_counts / tag_counts[:, None])
+    trigram_transitions = compile_trigrams(tag_tag2_freq, tag_ids, tag_counts, transition_counts)
+
+    # Emission probabilities of the words of the training data, and the tags of the words seen only once,
+    # for each shape of word
+    rows = {}
+    offsets = [0]
+    emission_tags = []
+    emission_counts = []
+    shape_counts = {}
+    for word, word_tags in word_tag_freq.items():
+        rows[word] = len(rows)
+        for tag, freq in word_tags.items():
+            emission_tags.append(tag_ids[tag])
+            emission_counts.append(freq)
+        offsets.append(len(emission_tags))
+        if sum(word_tags.values()) == 1:
+            (tag,) = word_tags
+            shape_counts.setdefault(word_shape(word), np.zeros(num_tags))[tag_ids[tag]] += 1
+
+    # For unknown words, P(word|tag) is proportional to P(tag|shape)/P(tag), where P(tag|shape) is estimated from the
+    # words seen once and smoothed towards the tags of all words seen once
+    emission_tags = np.array(emission_tags, dtype=np.int64)
+    emission_probs = np.log(np.array(emission_counts, dtype=float) / tag_counts[emission_tags])
+    hapax = sum(shape_counts.values())
+    prior = hapax / hapax.sum()
+    shape_rows = {}
+    unknown_tags, unknown_probs = [], []
+    with np.errstate(divide='ignore'):
+        for shape, counts in sorted(shape_counts.items()) + [(None, np.zeros(num_tags))]:
+            row = np.log((counts + prior) / (counts.sum() + 1)) - np.log(tag_counts / tag_counts.sum())
+            (likely,) = np.nonzero(row >= row.max() + np.log(UNKNOWN_TAG_RATIO))
+            shape_rows[shape] = len(offsets) - 1
+            unknown_tags.append(likely)
+            unknown_probs.append(row[likely])
+            offsets.append(offsets[-1] + len(likely))
+
+    # Words a rule applies to can only have the rule's tag
+    rule_rows = {tag: len(offsets) - 1 + tag_ids[tag] for tag in tags}
+    offsets.extend(range(offsets[-1] + 1, offsets[-1] + num_tags + 1))
+
+    emission_tags = np.concatenate([emission_tags] + unknown_tags + [np.arange(num_tags)])
+    emission_probs = np.concatenate([emission_probs] + unknown_probs + [np.zeros(num_tags)])
+    return Model(tags, tag_ids, rows, shape_rows, rule_rows, np.array(offsets, dtype=np.int64), emission_tags,
+                 emission_probs, transitions, observed_transitions, trigram_transitions)
+
+
+# Returns the log P(tag|tag-2, tag-1) of the trigram tagger. Trigram, bigram and unigram estimates are interpolated
+# with weights chosen by deleted interpolation: every trigram of the training data votes, with its frequency, for the
+# estimate that predicts it best once the trigram itself is left out of the counts.
+def compile_trigrams(tag_tag2_freq, tag_ids, tag_counts, transition_counts):
+    num_tags = len(tag_ids)
+    trigram_counts = np.zeros((num_tags, num_tags, num_tags))
+    for (tag2, tag1), successors in tag_tag2_freq.items():
+        for tag, freq in successors.items():
+            trigram_counts[tag_ids[tag2], tag_ids[tag1], tag_ids[tag]] = freq
+
+    context_counts = trigram_counts.sum(axis=2, keepdims=True)
+    bigram_contexts = transition_counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unigram = tag_counts / tag_counts.sum()
+        bigram = np.where(bigram_contexts > 0, transition_counts / bigram_contexts, 0)
+        trigram = np.where(context_counts > 0, trigram_counts / context_counts, 0)
+
+        # The estimate of every trigram of the training data with its own occurrence left out
+        seen = trigram_counts > 0
+        left_out = np.stack([
+            np.broadcast_to((tag_counts - 1) / (tag_counts.sum() - 1), seen.shape),
+            np.broadcast_to(np.where(bigram_contexts > 1, (transition_counts - 1) / (bigram_contexts - 1), 0),
+                            seen.shape),
+            np.where(context_counts > 1, (trigram_counts - 1) / (context_counts - 1), 0)])
+    votes = np.bincount(left_out[:, seen].argmax(axis=0), weights=trigram_counts[seen], minlength=3)
+    weights = votes / votes.sum()
+
+    # Estimates of unseen contexts are left out, and the weights of the others scaled up to make up for them
+    interpolated = weights[0] * unigram + weights[1] * bigram + weights[2] * trigram
+    with np.errstate(divide='ignore'):
+        return np.log(interpolated / interpolated.sum(axis=2, keepdims=True))
+
+
+# Returns the compiled model of a training file. The model is loaded from cache_dir if the same training file was
+# trained on before, and trained and saved there otherwise. Models are named after the SHA-256 hash of the training file
+# and of the settings of compile_model, so a changed file or setting is trained on again. With no cache_dir, the model
+# is always trained.
+def train_model(filename, cache_dir=MODEL_CACHE_DIR):
+    if cache_dir is not None:
+        digest = hashlib.sha256(repr((MODEL_VERSION, SUFFIXES, UNKNOWN_TAG_RATIO)).encode('utf-8'))
+        with open(filename, 'rb') as data:
+            for block in iter(lambda: data.read(1 << 20), b""):
+                digest.update(block)
+        cache_file = os.path.join(cache_dir, digest.hexdigest() + ".bin")
+        try:
+            return load_model(cache_file)
+        except (OSError, ValueError):
+            pass
+
+    training_data = import_data(filename)
+    word_tag_freq, tag_tag1_freq, tag_freq = create_freq_tables(training_data)
+    model = compile_model(word_tag_freq, tag_tag1_freq, tag_freq, create_trigram_freq_table(training_data))
+
+    if cache_dir is not None:
+        # A cache that cannot be written to only means the next run trains again
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_model(model, cache_file)
+        except OSError:
+            pass
+    return model
+
+
+# Writes a compiled model to a binary file: a fixed header, the newline-separated tags, words of the training data and
+# groups of unknown words, then the arrays of the model. Every section is padded to a multiple of 8 bytes. Numbers are
+# stored in the machine's native byte order. The file is written under a temporary name and then renamed, so that other
+# processes never read a partly written file.
+def save_model(model, filename):
+    shapes = sorted(model.shape_rows, key=model.shape_rows.get)
+    names = model.tags + list(model.rows) + ["" if shape is None else shape for shape in shapes]
+    names = "\n".join(names).encode('utf-8')
+    arrays = [model.offsets.astype(np.int64), model.emission_tags.astype(np.int32), model.emission_probs,
+              model.transitions, model.observed_transitions, model.trigram_transitions]
+
+    temporary = filename + "." + str(os.getpid()) + ".tmp"
+    with open(temporary, 'wb') as file:
+        file.write(MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, len(model.tags), len(model.rows), len(shapes),
+                                     len(model.emission_tags), len(names)))
+        for data in [names] + [np.ascontiguousarray(array).tobytes() for array in arrays]:
+            file.write(data)
+            file.write(bytes(-len(data) % 8))
+    os.replace(temporary, filename)
+    return None
+
+
+# Reads a model file written by save_model. Raises ValueError if the file is not a model file of this version.
+def load_model(filename):
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if len(data) < MODEL_HEADER.size:
+        raise ValueError(filename + " is not a compatible tagger model file.")
+    magic, version, num_tags, num_words, num_shapes, num_entries, names_size = MODEL_HEADER.unpack_from(data)
+    if magic != MODEL_MAGIC or version != MODEL_VERSION:
+        raise ValueError(filename + " is not a compatible tagger model file.")
+    position = MODEL_HEADER.size
+
+    # Returns the next section of the file as an array of count numbers of the given type
+    def section(dtype, count):
+        nonlocal position
+        array = np.frombuffer(data, dtype, count, position)
+        position += -(-array.nbytes // 8) * 8
+        return array
+
+    names = section(np.uint8, names_size).tobytes().decode('utf-8').split("\n")
+    tags = names[:num_tags]
+    words = names[num_tags:num_tags + num_words]
+    shapes = [shape or None for shape in names[num_tags + num_words:]]
+    num_rows = num_words + num_shapes + num_tags
+    offsets = section(np.int64, num_rows + 1)
+    emission_tags = section(np.int32, num_entries).astype(np.int64)
+    emission_probs = section(np.float64, num_entries)
+    transitions = section(np.float64, num_tags * num_tags).reshape(num_tags, num_tags)
+    observed_transitions = section(np.float64, num_tags * num_tags).reshape(num_tags, num_tags)
+    trigram_transitions = section(np.float64, num_tags ** 3).reshape(num_tags, num_tags, num_tags)
+
+    tag_ids = {tag: i for i, tag in enumerate(tags)}
+    rows = {word: i for i, word in enumerate(words)}
+    shape_rows = {shape: num_words + i for i, shape in enumerate(shapes)}
+    rule_rows = {tag: num_words + num_shapes + i for i, tag in enumerate(tags)}
+    return Model(tags, tag_ids, rows, shape_rows, rule_rows, offsets, emission_tags, emission_probs, transitions,
+                 observed_transitions, trigram_transitions)
+
+
+# Returns the emission row of word
+def emission_row(model, word):
+    # A rule tag the training data never used cannot be forced
+    row = model.rule_rows.get(rule_tag(word))
+    if row is not None:
+        return row
+    row = model.rows.get(word)
+    if row is None:
+        row = model.shape_rows.get(word_shape(word), model.shape_rows[None])
+    return row
+
+
+# Returns whether a word ends a sentence for both taggers: the greedy tagger always tags the next word following tag
+# ".", and the Viterbi algorithm always starts a new sentence after it. Text split after such words is tagged exactly
+# as if it was tagged whole.
+def ends_sentence(model, word):
+    return word in model.rows and "." in model.tag_ids and SENTENCE_FINAL.match(word) is not None
+
+
+# POS-tags test data with the Viterbi algorithm, finding the most likely sequence of tags for every sentence
+def viterbi_tagger(test_data, model):
+    words = [word.replace("<FWD_SLASH>", "\\/") for word in test_data]
+    best_tags = viterbi_tag_ids(model, words)
+    return [word + '/' + model.tags[tag] for word, tag in zip(words, best_tags.tolist())]
+
+
+# Returns the IDs of the tags the Viterbi algorithm gives words. Sentences end after every sentence-final punctuation
+# mark, and also before every word for which starts, if given, is True.
+def viterbi_tag_ids(model, words, starts=None):
+    token_rows = word_rows(model, words)
+    return viterbi_decode(model, token_rows, sentence_positions(model, token_rows, starts))
+
+
+# Returns the emission rows of words as an array, looking up the row of every distinct word once
+def word_rows(model, words):
+    cache = {}
+    token_rows = []
+    for word in words:
+        row = cache.get(word)
+        if row is None:
+            row = cache[word] = emission_row(model, word)
+        token_rows.append(row)
+    return np.array(token_rows, dtype=np.int64)
+
+
+# Returns the position of every word in its sentence, given the emission rows of the words. Sentences end after every
+# sentence-final punctuation mark, and also before every word for which starts, if given, is True.
+def sentence_positions(model, token_rows, starts=None):
+    first_words = np.zeros(len(token_rows), dtype=bool)
+    first_words[1:] = token_rows[:-1] == model.rule_rows.get(".", -1)
+    if starts is not None:
+        first_words |= starts
+    first_words[:1] = True
+    sentence_starts = np.flatnonzero(first_words)
+    return np.arange(len(token_rows)) - sentence_starts[np.cumsum(first_words) - 1]
+
+
+# Finds the most likely sequence of tags of every sentence, for all sentences at once. token_rows holds the emission
+# row of every word, and positions the position of every word in its sentence. A state is a pair of a word and one of
+# the tags of its emission row, and the words are ordered by their position in their sentence, so the states of the
+# n-th words of all sentences form one contiguous slice and each step of the algorithm is a handful of array
+# operations over the transitions into that slice.
+def viterbi_decode(model, token_rows, positions):
+    num_words = len(positions)
+    if num_words == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(positions, kind='stable')
+    rank = np.empty(num_words, dtype=np.int64)
+    rank[order] = np.arange(num_words)
+    transitions = model.transitions
+
+    # States, sorted by the rank of their word, with the range of the states of each word
+    row_starts = model.offsets[token_rows[order]]
+    num_states = model.offsets[token_rows[order] + 1] - row_starts
+    first_state = np.concatenate(([0], np.cumsum(num_states)))
+    state_words = np.repeat(np.arange(num_words), num_states)
+    entries = row_starts[state_words] + np.arange(first_state[-1]) - first_state[state_words]
+    state_tags = model.emission_tags[entries]
+    scores = model.emission_probs[entries]
+
+    # Transitions into every state from each state of the previous word of its sentence, grouped by the state
+    # they lead to
+    ordered_positions = positions[order]
+    previous = np.where(ordered_positions > 0, rank[np.maximum(order - 1, 0)], -1)
+    num_sources = np.where(previous >= 0, num_states[np.maximum(previous, 0)], 0)[state_words]
+    first_edge = np.concatenate(([0], np.cumsum(num_sources)))
+    edge_targets = np.repeat(np.arange(len(state_words)), num_sources)
+    edge_sources = (first_state[previous[state_words[edge_targets]]] + np.arange(first_edge[-1]) -
+                    first_edge[edge_targets])
+    edge_scores = transitions[state_tags[edge_sources], state_tags[edge_targets]]
+
+    # The first word of a sentence follows the end of the one before it
+    initial = transitions[model.tag_ids["."]] if "." in model.tag_ids else np.zeros(len(model.tags))
+    scores[num_sources == 0] += initial[state_tags[num_sources == 0]]
+    backpointers = np.full(len(state_words), -1)
+    step_bounds = np.searchsorted(ordered_positions, np.arange(ordered_positions[-1] + 2))
+    for step in range(1, len(step_bounds) - 1):
+        lo, hi = first_state[step_bounds[step]], first_state[step_bounds[step + 1]]
+        edges = slice(first_edge[lo], first_edge[hi])
+        candidates = scores[edge_sources[edges]] + edge_scores[edges]
+        best = np.maximum.reduceat(candidates, first_edge[lo:hi] - first_edge[lo])
+        scores[lo:hi] += best
+        backpointers[lo:hi] = edge_sources[edges][first_max(candidates, best, num_sources[lo:hi])]
+
+    # Follow the backpointers from the best state of the last word of every sentence
+    last_words = np.flatnonzero(np.append(positions[1:] == 0, True))
+    best = np.maximum.reduceat(scores, first_state[:-1])
+    states = first_max(scores, best, num_states)[rank[last_words]]
+    best_tags = np.empty(num_words, dtype=np.int64)
+    while states.size:
+        best_tags[order[state_words[states]]] = state_tags[states]
+        states = backpointers[states]
+        states = states[states >= 0]
+    return best_tags
+
+
+# Returns the index in values of the first maximum of every group, given the consecutive group sizes and the maximum
+# of every group
+def first_max(values, maxima, sizes):
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    hits = np.flatnonzero(values == maxima[groups])
+    return hits[np.concatenate(([True], groups[hits][1:] != groups[hits][:-1]))]
+
+
+# POS-tags test data with a second-order hidden Markov model, in which the tag of a word depends on the tags of the two
+# words before it. Only the beam most likely pairs of tags are kept for every word (all of them if beam is 0).
+def trigram_tagger(test_data, model, beam=TRIGRAM_BEAM):
+    words = [word.replace("<FWD_SLASH>", "\\/") for word in test_data]
+    token_rows = word_rows(model, words)
+    best_tags = trigram_decode(model, token_rows, sentence_positions(model, token_rows), beam)
+    return [word + '/' + model.tags[tag] for word, tag in zip(words, best_tags.tolist())]
+
+
+# Finds the most likely sequence of tags of every sentence under the trigram model, for all sentences at once, with
+# the Viterbi algorithm over pairs of tags. A state is a word together with its tag and the tag of the word before it.
+# At every step, the states of the n-th words of all sentences are extended by the tags of their successors, states
+# reached more than once keep their best path, and only the beam best states of every word are kept, so the work per
+# word is bounded whatever the number of tags. The first word of a sentence follows the end of the one before it, as in
+# viterbi_decode.
+def trigram_decode(model, token_rows, positions, beam=TRIGRAM_BEAM):
+    num_words = len(token_rows)
+    best_tags = np.empty(num_words, dtype=np.int64)
+    if num_words == 0:
+        return best_tags
+    num_tags = len(model.tags)
+    trigrams = model.trigram_transitions
+    sentence_end = model.tag_ids.get(".", 0)
+    initial = model.transitions[sentence_end] if "." in model.tag_ids else np.zeros(num_tags)
+    last_words = np.append(positions[1:] == 0, True)
+    order = np.argsort(positions, kind='stable')
+    step_bounds = np.searchsorted(positions[order], np.arange(positions.max() + 2))
+
+    # For every step: the word, tag and previous tag of every state, sorted by word and then by score, its score, and
+    # the index of the state of the previous step it is best reached from
+    steps = []
+    for step in range(len(step_bounds) - 1):
+        words = order[step_bounds[step]:step_bounds[step + 1]]
+
+        # The tags each word can have
+        row_starts = model.offsets[token_rows[words]]
+        num_candidates = model.offsets[token_rows[words] + 1] - row_starts
+        first_candidate = np.cumsum(num_candidates) - num_candidates
+        candidate_words = np.repeat(np.arange(len(words)), num_candidates)
+        entries = row_starts[candidate_words] + np.arange(num_candidates.sum()) - first_candidate[candidate_words]
+        candidate_tags = model.emission_tags[entries]
+        candidate_scores = model.emission_probs[entries]
+
+        if step == 0:
+            state_words, tags = candidate_words, candidate_tags
+            previous_tags = np.full(len(tags), sentence_end)
+            scores = candidate_scores + initial[tags]
+            backpointers = np.full(len(tags), -1)
+        else:
+            # Extend every state of the previous word by every tag of the word
+            last_words_of, last_previous_tags, last_tags, last_scores = steps[-1][:4]
+            lo = np.searchsorted(last_words_of, words - 1, 'left')
+            num_sources = (np.searchsorted(last_words_of, words - 1, 'right') - lo)[candidate_words]
+            first_edge = np.cumsum(num_sources) - num_sources
+            edge_candidates = np.repeat(np.arange(len(candidate_tags)), num_sources)
+            edge_sources = lo[candidate_words[edge_candidates]] + np.arange(num_sources.sum()) - \
+                first_edge[edge_candidates]
+            edge_tags = candidate_tags[edge_candidates]
+            edge_scores = (last_scores[edge_sources] + candidate_scores[edge_candidates] +
+                           trigrams[last_previous_tags[edge_sources], last_tags[edge_sources], edge_tags])
+
+            # Keep the best path into every state
+            keys = (candidate_words[edge_candidates] * num_tags + last_tags[edge_sources]) * num_tags + edge_tags
+            best = np.lexsort((-edge_scores, keys))
+            best = best[np.append(True, keys[best][1:] != keys[best][:-1])]
+            state_words, tags = candidate_words[edge_candidates[best]], edge_tags[best]
+            previous_tags = last_tags[edge_sources[best]]
+            scores = edge_scores[best]
+            backpointers = edge_sources[best]
+
+        # Sort the states of every word from best to worst and keep the first beam of them
+        ranked = np.lexsort((-scores, state_words))
+        if beam:
+            group_starts = np.searchsorted(state_words[ranked], state_words[ranked], 'left')
+            ranked = ranked[np.arange(len(ranked)) - group_starts < beam]
+        steps.append((words[state_words[ranked]], previous_tags[ranked], tags[ranked], scores[ranked],
+                      backpointers[ranked]))
+
+    # Follow the backpointers from the best state of the last word of every sentence
+    follow = np.zeros(0, dtype=np.int64)
+    for state_words, _, tags, _, backpointers in reversed(steps):
+        firsts = np.flatnonzero(np.append(True, state_words[1:] != state_words[:-1]))
+        chosen = np.concatenate((follow, firsts[last_words[state_words[firsts]]]))
+        best_tags[state_words[chosen]] = tags[chosen]
+        follow = backpointers[chosen]
+    return best_tags
+
+
+# POS-tags test data one word at a time, giving each word the tag that maximizes P(word|tag) * P(tag|tag-1). tag1 is
+# the ID of the tag the first word follows, if the test data continues text that was already tagged. decide is the
+# function returned by greedy_decider, which is made for the call if none is given.
+def pos_tagger(test_data, model, tag1=None, decide=None):
+    if decide is None:
+        decide = greedy_decider(model)
+
+    tagged_words = []
+    for word in test_data:
+        # replace <FWD_SLASH> tag generated in import_data with \/
+        word = word.replace("<FWD_SLASH>", "\\/")
+        tag, tag1 = decide(tag1, word)
+        tagged_words.append(word + '/' + model.tags[tag])
+
+    return tagged_words
+
+
+# Returns a function that decides the tag the greedy tagger gives a word following the tag with ID tag1, returning the
+# ID of the tag and the ID of the tag the next word follows. The decision depends on nothing else, and the same pairs
+# of tag and word come up over and over in text, so the most recent cache_size decisions are cached. The function's
+# cache_info() gives the number of hits and misses of the cache.
+def greedy_decider(model, cache_size=DECISION_CACHE_SIZE):
+    # Plain lists are faster than arrays to index one number at a time
+    offsets = model.offsets.tolist()
+    emission_tags = model.emission_tags.tolist()
+    emission_probs = model.emission_probs.tolist()
+    transitions = model.observed_transitions.tolist()
+    tag_ids, rows = model.tag_ids, model.rows
+    unknown_tag = tag_ids.get("NN")
+
+    # Custom rules give some words the same tag whatever the words around them. They only apply to words of the
+    # training data, so they are worked out for all of them at once.
+    forced_tags = {}
+    for word in rows:
+        tag = tag_ids.get(rule_tag(word))
+        if tag is not None:
+            forced_tags[word] = tag
+
+    @lru_cache(maxsize=cache_size)
+    def decide(tag1, word):
+        # assume any word found in test data that's not in training data is a singular/mass noun (NN)
+        row = rows.get(word)
+        if row is None:
+            return unknown_tag, unknown_tag
+        max_tag = forced_tags.get(word)
+        if max_tag is not None:
+            return max_tag, max_tag
+        first, last = offsets[row], offsets[row + 1]
+
+        # find tag that maximizes log P(word|tag) + log P(tag|tag-1), among the tags seen after tag-1
+        max_prob = -np.inf
+        if tag1 is not None:
+            successors = transitions[tag1]
+            for i in range(first, last):
+                current_prob = emission_probs[i] + successors[emission_tags[i]]
+                if current_prob > max_prob:
+                    max_prob = current_prob
+                    max_tag = emission_tags[i]
+
+        # First word case (no tag-1), or none of the tags of the word were seen after tag-1: find tag that maximizes
+        # P(word|tag)
+        if max_tag is None:
+            for i in range(first, last):
+                if emission_probs[i] > max_prob:
+                    max_prob = emission_probs[i]
+                    max_tag = emission_tags[i]
+
+        # As it always has, the next word is tagged following the last tag the word was seen with in training
+        return max_tag, emission_tags[last - 1]
+
+    return decide
+
+
+# Tags sentences in the calling process, for programs that use tagger.py as a module rather than through files:
+#
+#   tagger = Tagger.train("pos-train.txt")
+#   tagger.tag(["Stocks", "fell", "."])     # [("Stocks", "NNP"), ("fell", "VBD"), (".", ".")]
+#   tagger.tag_many(sentences, ids=True)    # an array of tag IDs for each sentence, naming tags in tagger.tags
+#
+# Every sentence is tagged as if it followed the end of another sentence. A Tagger never changes once made, and the
+# greedy tagger's decision cache is thread-safe, so a single Tagger can be shared by any number of threads.
+class Tagger:
+    def __init__(self, model, greedy=False):
+        self.model = model
+        self.tags = model.tags
+        self.greedy = greedy
+        self.decide = greedy_decider(model) if greedy else None
+        # Plain lists are faster than arrays to index one number at a time
+        self.offsets = model.offsets.tolist()
+        self.emission_tags = model.emission_tags.tolist()
+        self.emission_probs = model.emission_probs.tolist()
+        self.transitions = model.transitions.tolist()
+        self.initial = self.transitions[model.tag_ids["."]] if "." in model.tag_ids else [0.0] * len(model.tags)
+
+    # Trains a Tagger on a training file, or loads its model from cache_dir if the file was trained on before
+    @classmethod
+    def train(cls, filename, greedy=False, cache_dir=MODEL_CACHE_DIR):
+        return cls(train_model(filename, cache_dir), greedy)
+
+    # Returns the tags of the words of a sentence as (word, tag) pairs, or as an array of tag IDs with ids=True
+    def tag(self, tokens, ids=False):
+        return self.tag_many([tokens], ids)[0]
+
+    # Returns the tags of the words of every sentence in a list, as tag() does. The Viterbi algorithm decodes all the
+    # sentences together, which is much faster than one at a time.
+    def tag_many(self, sentences, ids=False):
+        sentences = [list(tokens) for tokens in sentences]
+        if self.greedy:
+            follows = self.model.tag_ids.get(".")
+            tag_ids = [np.array(self.greedy_tag_ids(tokens, follows), dtype=np.int64) for tokens in sentences]
+        elif sum(len(tokens) for tokens in sentences) <= LIST_DECODE_WORDS:
+            tag_ids = [np.array(self.viterbi_list_ids(tokens), dtype=np.int64) for tokens in sentences]
+        else:
+            lengths = np.array([len(tokens) for tokens in sentences], dtype=np.int64)
+            ends = np.cumsum(lengths)
+            starts = np.zeros(ends[-1] if len(ends) else 0, dtype=bool)
+            starts[ends[:-1][lengths[1:] > 0]] = True
+            words = [word for tokens in sentences for word in tokens]
+            tag_ids = np.split(viterbi_tag_ids(self.model, words, starts), ends[:-1])
+        if ids:
+            return tag_ids
+        return [list(zip(tokens, [self.tags[tag] for tag in sentence_ids.tolist()]))
+                for tokens, sentence_ids in zip(sentences, tag_ids)]
+
+    # Returns the IDs of the tags the Viterbi algorithm gives the words of a sentence, like viterbi_tag_ids but on plain
+    # lists. Ties are broken the same way, so the tags are the same.
+    def viterbi_list_ids(self, tokens):
+        offsets, emission_tags, emission_probs = self.offsets, self.emission_tags, self.emission_probs
+        transitions = self.transitions
+        sentence_final = self.model.rule_rows.get(".", -1)
+
+        # Tags and scores of the states of every word, and the state of the previous word each state is best reached
+        # from, or None for the first word of a sentence
+        step_tags, step_scores, backpointers = [], [], []
+        row = sentence_final
+        for word in tokens:
+            first_word = row == sentence_final
+            row = emission_row(self.model, word)
+            tags = emission_tags[offsets[row]:offsets[row + 1]]
+            probs = emission_probs[offsets[row]:offsets[row + 1]]
+            if first_word:
+                scores = [prob + self.initial[tag] for tag, prob in zip(tags, probs)]
+                pointers = None
+            else:
+                previous_tags, previous_scores = step_tags[-1], step_scores[-1]
+                scores, pointers = [], []
+                for tag, prob in zip(tags, probs):
+                    best, best_state = -np.inf, 0
+                    for state, previous_tag in enumerate(previous_tags):
+                        score = previous_scores[state] + transitions[previous_tag][tag]
+                        if score > best:
+                            best, best_state = score, state
+                    scores.append(prob + best)
+                    pointers.append(best_state)
+            step_tags.append(tags)
+            step_scores.append(scores)
+            backpointers.append(pointers)
+
+        # Follow the backpointers from the best state of the last word of every sentence
+        tag_ids = [0] * len(tokens)
+        state = None
+        for i in range(len(tokens) - 1, -1, -1):
+            if state is None:
+                scores = step_scores[i]
+                state = scores.index(max(scores))
+            tag_ids[i] = step_tags[i][state]
+            state = None if backpointers[i] is None else backpointers[i][state]
+        return tag_ids
+
+    # Returns the IDs of the tags the greedy tagger gives the words of a sentence following the tag with ID tag1
+    def greedy_tag_ids(self, tokens, tag1):
+        decide = self.decide
+        tag_ids = []
+        for word in tokens:
+            tag, tag1 = decide(tag1, word)
+            tag_ids.append(tag)
+        return tag_ids
+
+
+# Splits blocks of words read by read_words into batches of whole sentences. The first batch is the first sentence,
+# and each batch after it ends at the last sentence end once at least twice as many words as were in the batch before,
+# up to STREAM_BATCH_WORDS, have been read.
+def iter_batches(blocks, model):
+    batch = []
+    batch_words = 1
+    for words in blocks:
+        batch.extend(words)
+        while len(batch) >= batch_words:
+            # Find the end of the last sentence, or of the first if no batch was made yet
+            if batch_words == 1:
+                end = next((i + 1 for i, word in enumerate(batch) if ends_sentence(model, word)), 0)
+            else:
+                end = next((i + 1 for i in range(len(batch) - 1, -1, -1) if ends_sentence(model, batch[i])), 0)
+            if end == 0:
+                break
+            yield batch[:end]
+            batch_words = min(2 * end, STREAM_BATCH_WORDS)
+            batch = batch[end:]
+    if batch:
+        yield batch
+
+
+# POS-tags one batch of whole sentences with the given method: "viterbi", "greedy" or "trigram". Every batch but the
+# first of a text follows the end of a sentence. decide is the function returned by greedy_decider for the greedy
+# tagger, and beam the beam width of the trigram tagger.
+def tag_batch(batch, model, method, first, decide=None, beam=TRIGRAM_BEAM):
+    if method == "greedy":
+        return pos_tagger(batch, model, None if first else model.tag_ids["."], decide)
+    if method == "trigram":
+        return trigram_tagger(batch, model, beam)
+    return viterbi_tagger(batch, model)
+
+
+# The compiled model of a worker process of parallel_tagger, sent to the worker once when it starts, and the worker's
+# own greedy decision cache
+worker_model = None
+worker_decide = None
+
+
+# Sets the model the worker process tags with
+def set_worker_model(model):
+    global worker_model, worker_decide
+    worker_model = model
+    worker_decide = greedy_decider(model)
+
+
+# POS-tags one batch of whole sentences in a worker process
+def tag_worker_batch(batch, method, first, beam):
+    return tag_batch(batch, worker_model, method, first, worker_decide, beam)
+
+
+# POS-tags batches of whole sentences in a pool of worker processes, yielding the tagged batches in their original
+# order. At most twice as many batches as there are workers are tagged at once, so that batches are read only as fast
+# as they are tagged.
+def parallel_tagger(batches, model, method, workers, beam=TRIGRAM_BEAM):
+    with ProcessPoolExecutor(workers, initializer=set_worker_model, initargs=(model,)) as executor:
+        pending = deque()
+        for i, batch in enumerate(batches):
+            pending.append(executor.submit(tag_worker_batch, batch, method, i == 0, beam))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# POS-tags batches of whole sentences, with a pool of worker processes if there is more than one worker. Otherwise,
+# the greedy tagger decides with decide, or with a decision cache shared by all the batches if none is given.
+def tag_batches(batches, model, method="viterbi", workers=1, decide=None, beam=TRIGRAM_BEAM):
+    if workers > 1:
+        return parallel_tagger(batches, model, method, workers, beam)
+    if method == "greedy" and decide is None:
+        decide = greedy_decider(model)
+    return (tag_batch(batch, model, method, i == 0, decide, beam) for i, batch in enumerate(batches))
+
+
+# POS-tags a test file as it is read, writing out every batch of sentences as soon as it is tagged, so that memory
+# use does not grow with the size of the file. The output is the same as tagging the whole file at once.
+def stream_tagger(filename, model, output_filename, method="viterbi", workers=1, decide=None, beam=TRIGRAM_BEAM):
+    with open(output_filename, "w") as output_file:
+        separator = ""
+        batches = iter_batches(read_words(filename), model)
+        for tagged_words in tag_batches(batches, model, method, workers, decide, beam):
+            output_file.write(separator + "\n".join(tagged_words))
+            output_file.flush()
+            separator = "\n"
+    return None
+
+
+# Writes list to plain text file
+def write_to_file(tagged_words, filename):
+    with open(filename, "w") as output_file:
+        output_file.write("\n".join(tagged_words))
+    return None
+
+
+# Prints error message for improper command line arguments
+def print_error():
+    print('Invalid arguments. Please enter properly formatted arguments:')
+    print('python tagger.py [--greedy | --trigram [--beam=b]] [--stream] [--workers=k] [--cache-stats] [--no-cache] '
+          'pos-train.txt pos-test.txt > pos-test-with-tags.txt')
+    print('\nReplace "pos-train.txt" with the name of the training file,')
+    print('"pos-test.txt" with the name of the test file,')
+    print('and "pos-test-with-tags.txt" with your desired output file name.')
+    print('Ensure trainer and test files are placed in the same directory as tagger.py.')
+    print('If no arguments are entered after pos-train.txt and pos-test.txt,')
+    print('then the name of the output file will default to "pos-test-with-tags.txt."')
+    return None
+
+
+# Prints the hit rate of the greedy tagger's decision cache if asked to. Worker processes keep caches of their own,
+# which are not counted.
+def print_cache_stats(decide, options, workers):
+    if "--cache-stats" not in options or decide is None or workers > 1:
+        return None
+    info = decide.cache_info()
+    lookups = info.hits + info.misses
+    print('Decision cache: %d hits, %d misses, %.1f%% hit rate, %d of %d entries used' %
+          (info.hits, info.misses, 100 * info.hits / max(lookups, 1), info.currsize, info.maxsize))
+    return None
+
+
+def main():
+    # Separate options from the other arguments
+    options = [arg for arg in argv[1:] if arg.startswith("--")]
+    args = [arg for arg in argv if not arg.startswith("--")]
+
+    # Number of processes tagging in parallel, and beam width of the trigram tagger
+    workers = 1
+    beam = TRIGRAM_BEAM
+    for option in options:
+        if option.startswith("--workers="):
+            value = option[len("--workers="):]
+            workers = int(value) if value.isdigit() else 0
+        elif option.startswith("--beam="):
+            value = option[len("--beam="):]
+            beam = int(value) if value.isdigit() else -1
+
+    # Tagging method
+    method = "greedy" if "--greedy" in options else "trigram" if "--trigram" in options else "viterbi"
+
+    # Print error and exit if training and test files are not specified in the command line
+    flags = ("--greedy", "--trigram", "--stream", "--cache-stats", "--no-cache")
+    if len(args) < 3 or workers < 1 or beam < 0 or ("--greedy" in options and "--trigram" in options) or \
+            any(option not in flags and not option.startswith(("--workers=", "--beam=")) for option in options):
+        print_error()
+        exit()
+
+    # Obtain the log probability tables compiled from the training data, from the model cache if it was trained on
+    # before
+    model = train_model(args[1], None if "--no-cache" in options else MODEL_CACHE_DIR)
+
+    # Obtain output filename from command line, or give it default name
+    if len(args) >= 5 and args[3] == ">":
+        output_filename = args[4]
+    else:
+        output_filename = "pos-test-with-tags.txt"
+
+    # The greedy tagger's cache of decisions
+    decide = greedy_decider(model) if method == "greedy" else None
+
+    # Tag the test data as it is read, writing out each batch of sentences as soon as it is tagged
+    if "--stream" in options:
+        stream_tagger(args[2], model, output_filename, method, workers, decide, beam)
+        print('Success! Open "' + output_filename + '" in the current directory to view the POS-tagged test data.')
+        print_cache_stats(decide, options, workers)
+        return
+
+    # Process test data and store in list
+    test_data = import_data(args[2])
+    # print(test_data)
+
+    # Obtain POS-tagged word list
+    if workers > 1:
+        # Split the test data into batches of whole sentences, several for each worker
+        size = max(STREAM_BATCH_WORDS, -(-len(test_data) // (4 * workers)))
+        blocks = (test_data[i:i + size] for i in range(0, len(test_data), size))
+        tagged_words = []
+        for tagged_batch in tag_batches(iter_batches(blocks, model), model, method, workers, decide, beam):
+            tagged_words.extend(tagged_batch)
+    elif method == "greedy":
+        tagged_words = pos_tagger(test_data, model, decide=decide)
+    elif method == "trigram":
+        tagged_words = trigram_tagger(test_data, model, beam)
+    else:
+        tagged_words = viterbi_tagger(test_data, model)
+    # print(tagged_words)
+
+    # Write the POS-tagged list to a plain text file
+    write_to_file(tagged_words, output_filename)
+
+    print('Success! Open "' + output_filename + '" in the current directory to view the POS-tagged test data.')
+    print_cache_stats(decide, options, workers)
+
+
+if __name__ == "__main__":
+    main()
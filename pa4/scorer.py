@@ -19,8 +19,13 @@ name of the answer key file. Both should be in the same directory as scorer.py
 """
 
 from sys import argv
-import pandas as pd
+import os
 import re
+import sys
+
+# Scoring is shared with the scorers of the other programming assignments, in scoring.py one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import scoring  # noqa: E402
 
 
 # Reads text files and returns them as a string list with brackets removed
@@ -42,34 +47,18 @@ def create_array(pair_list):
 
 # Calculate score
 def scorer(prediction, key):
-    match = 0
-    total = len(key)  # Denominator is the number of tagged pairs
-
-    # Iterate through key array, if there's a match with prediction array, then iterate match
-    #
-    for i in range(len(key)):
-        if prediction[i] == key[i]:
-            match += 1
-
-    return match / total
+    return scoring.score(prediction, key)
 
 
+# Returns the confusion matrix as text, laid out as pandas prints a crosstab
 def create_confusion_matrix(prediction, key):
-    y_actual = pd.Series(key, name="Actual Word Sense")
-    x_prediction = pd.Series(prediction, name="Predicted Word Sense")
-
-    # These four settings make Panda display the whole matrix
-    pd.set_option('display.max_rows', None)
-    pd.set_option('display.max_columns', None)
-    pd.set_option('display.width', None)
-    pd.set_option('display.max_colwidth', None)
-
-    return pd.crosstab(y_actual, x_prediction)
+    matrix = scoring.confusion_matrix(prediction, key, "Actual Word Sense", "Predicted Word Sense")
+    return scoring.format_confusion_matrix(matrix)
 
 
 def write_to_file(score, matrix, filename):
     with open(filename, "w") as output_file:
-        output_file.write("The accuracy of wsd.py is: " + str.format('{0:.2f}', score) + "%.\n\n" + matrix.to_string())
+        output_file.write("The accuracy of wsd.py is: " + str.format('{0:.2f}', score) + "%.\n\n" + matrix)
 
     return None
 
@@ -0,0 +1,61 @@
+"""
+Scoring shared by the scorers of programming assignments 3, 4 and 5
+
+scoring.py holds what pa3/scorer.py, pa4/scorer.py and pa5/scorer.py have in common: the accuracy of a list of
+predicted labels against a key, and the confusion matrix of the two, printed in the same layout as a pandas crosstab.
+The scorers only differ in how they read labels from their files and how they report the results.
+
+The confusion matrix is counted with a Counter over pairs of labels and formatted here, so scoring needs nothing but
+the standard library and starts in a few milliseconds rather than the second or more it takes to import pandas.
+"""
+
+from collections import Counter, namedtuple
+
+# Confusion matrix of predicted labels against a key. actual_labels and predicted_labels are the sorted distinct labels
+# of the key and of the prediction, and counts[i][j] is the number of times actual_labels[i] was predicted as
+# predicted_labels[j]. actual_name and predicted_name name the rows and the columns.
+ConfusionMatrix = namedtuple("ConfusionMatrix", ["actual_name", "predicted_name", "actual_labels", "predicted_labels",
+                                                 "counts"])
+
+
+# Returns the fraction of the labels of key that prediction matches, position by position
+def score(prediction, key):
+    match = 0
+    total = len(key)  # Denominator is the number of labels in the key
+
+    for i in range(len(key)):
+        if prediction[i] == key[i]:
+            match += 1
+
+    return match / total
+
+
+# Counts every pair of an actual and a predicted label at the same position. Positions past the end of the shorter
+# list are left out, as pandas does when it lines up lists of different lengths.
+def confusion_matrix(prediction, key, actual_name, predicted_name):
+    pairs = Counter(zip(key, prediction))
+    actual_labels = sorted({actual for actual, predicted in pairs})
+    predicted_labels = sorted({predicted for actual, predicted in pairs})
+    columns = {label: j for j, label in enumerate(predicted_labels)}
+    rows = {label: i for i, label in enumerate(actual_labels)}
+
+    counts = [[0] * len(predicted_labels) for label in actual_labels]
+    for (actual, predicted), count in pairs.items():
+        counts[rows[actual]][columns[predicted]] = count
+    return ConfusionMatrix(actual_name, predicted_name, actual_labels, predicted_labels, counts)
+
+
+# Returns a confusion matrix as text, laid out the way pandas prints a crosstab: a header line naming the columns and
+# listing the predicted labels, a line naming the rows, then a line for every actual label. The labels of the rows are
+# aligned left, and every column is aligned right to its widest entry, two spaces apart.
+def format_confusion_matrix(matrix):
+    cells = [[str(count) for count in row] for row in matrix.counts]
+    index_width = max(len(label) for label in [matrix.actual_name, matrix.predicted_name] + matrix.actual_labels)
+    widths = [max([len(label)] + [len(row[j]) for row in cells]) for j, label in enumerate(matrix.predicted_labels)]
+
+    header = matrix.predicted_name.ljust(index_width) + \
+        "".join("  " + label.rjust(width) for label, width in zip(matrix.predicted_labels, widths))
+    lines = [header, matrix.actual_name.ljust(len(header))]
+    for label, row in zip(matrix.actual_labels, cells):
+        lines.append(label.ljust(index_width) + "".join("  " + cell.rjust(width) for cell, width in zip(row, widths)))
+    return "\n".join(lines)